@@ -2,6 +2,7 @@ from django.http import Http404
 
 from common.views import render
 from main.models import TrafficStatistic
+from database.models import beatmap_cache
 
 from asgiref.sync import sync_to_async
 
@@ -23,5 +24,6 @@ async def index(req):
         return list(TrafficStatistic.objects.order_by("-timestamp")[:24])
 
     return await render(req, "admin/index.html", extra_context={
-        "statistics": reversed(await sync_to_async(get_traffic)())
+        "statistics": reversed(await sync_to_async(get_traffic)()),
+        "parsed_beatmap_stats": beatmap_cache.get_parsed_beatmap_stats()
     })
@@ -0,0 +1,276 @@
+from django.db import connection, transaction, DatabaseError
+from asgiref.sync import sync_to_async
+
+from common.validation import *
+from common.exceptions import ExpectedException, ClientException
+from database.models import Mappool, Tournament, beatmap_resolver, user_resolver
+
+from .views.mappools import MAPPOOL_FORMAT
+from .views.tournaments import TOURNAMENT_FORMAT
+from .views.listing import listing_counts
+
+from typing import AsyncIterable, AsyncIterator, IO, Iterable
+import itertools
+import asyncio
+import json
+
+
+__all__ = (
+    "Importer",
+    "read_lines",
+)
+
+
+# tournaments can list existing mappools by id, or new ones to create along with them
+IMPORT_TOURNAMENT_FORMAT = DictionaryType({
+    **TOURNAMENT_FORMAT.fmt,
+    "mappools": ListType(
+        DictionaryType({
+            "id": IntegerType(minimum=0, optional=True),
+            "mappool": DictionaryType(MAPPOOL_FORMAT.fmt, optional=True),
+            "name_override": StringType(range(1, 65), optional=True)
+        }),
+        max_len=20
+    )
+})
+FORMATS = {
+    "mappool": MAPPOOL_FORMAT,
+    "tournament": IMPORT_TOURNAMENT_FORMAT
+}
+# ids looked up before waiting on the osu api; each lookup is split into requests of 50
+PREFETCH_SIZE = 1000
+# lines parsed and prefetched at a time, so memory use doesn't grow with the size of the import
+BATCH_SIZE = 250
+# lines read per trip to a worker thread
+READ_CHUNK_SIZE = 100
+
+
+def _read_chunk(file: IO, max_line_size: int | None) -> list[str | bytes]:
+    lines = []
+    size = -1 if max_line_size is None else max_line_size + 1
+    while len(lines) < READ_CHUNK_SIZE and (line := file.readline(size)):
+        if max_line_size is not None and len(line) > max_line_size and line[-1:] not in ("\n", b"\n"):
+            while (rest := file.readline(size)) and rest[-1:] not in ("\n", b"\n"):
+                pass
+        lines.append(line)
+
+    return lines
+
+
+async def read_lines(file: IO, max_line_size: int | None = None) -> AsyncIterator[str | bytes]:
+    """Yields the lines of a file (or request), read in a worker thread a chunk at a time so the
+    event loop never waits on it. Lines longer than max_line_size are cut off after
+    max_line_size + 1 bytes, and the rest of them is skipped"""
+    read_chunk = sync_to_async(_read_chunk, thread_sensitive=False)
+    while lines := await read_chunk(file, max_line_size):
+        for line in lines:
+            yield line
+
+
+async def _batched(items: AsyncIterable, n: int) -> AsyncIterator[tuple]:
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) == n:
+            yield tuple(batch)
+            batch = []
+
+    if len(batch) > 0:
+        yield tuple(batch)
+
+
+class Importer:
+    """Imports mappools and tournaments from ndjson, one object per line with a "type" of "mappool" or "tournament".
+
+    Lines are read in batches; everything a batch references is resolved up front, then it's
+    written through new_mappool/new_tournament in chunks of lines that share a transaction."""
+
+    def __init__(
+        self,
+        submitted_by,
+        chunk_size: int = 100,
+        concurrency: int = 8,
+        max_lines: int | None = None,
+        max_line_size: int | None = None
+    ):
+        self.submitted_by = submitted_by
+        self.chunk_size: int = chunk_size
+        self.concurrency: int = concurrency
+        self.max_lines: int | None = max_lines
+        self.max_line_size: int | None = max_line_size
+
+        self.mappools: int = 0
+        self.tournaments: int = 0
+        # (line number, message)
+        self.errors: list[tuple[int, str]] = []
+
+    def _parse_line(self, line: str | bytes) -> dict:
+        if self.max_line_size is not None and len(line.rstrip()) > self.max_line_size:
+            raise ClientException(f"Line is longer than {self.max_line_size} bytes")
+
+        try:
+            data = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ClientException("Invalid json data")
+
+        if not isinstance(data, dict) or data.get("type") not in FORMATS:
+            raise ClientException("Must be an object with a type of mappool or tournament")
+
+        result = FORMATS[data["type"]].validate(data)
+        if result.is_failed:
+            raise ClientException(result.msg)
+
+        if data["type"] == "tournament":
+            for mappool in data["mappools"]:
+                if (mappool.get("id") is None) == (mappool.get("mappool") is None):
+                    raise ClientException("Each tournament mappool needs either an id or a mappool")
+
+        return data
+
+    async def parse(self, lines: AsyncIterable[str | bytes]) -> AsyncIterator[tuple[int, dict]]:
+        """Yields the valid lines, and stops reading after max_lines"""
+        line_number = 0
+        async for line in lines:
+            line_number += 1
+            if self.max_lines is not None and line_number > self.max_lines:
+                self.errors.append((line_number, f"Only the first {self.max_lines} lines are imported"))
+                return
+            if line.strip() == "":
+                continue
+
+            try:
+                yield line_number, self._parse_line(line)
+            except ClientException as exc:
+                self.errors.append((line_number, exc.args[0]))
+
+    @staticmethod
+    def _get_mappools(data: dict) -> list[dict]:
+        if data["type"] == "mappool":
+            return [data]
+
+        return [mappool["mappool"] for mappool in data["mappools"] if mappool.get("mappool") is not None]
+
+    async def _prefetch(self, items: Iterable[tuple[int, dict]]):
+        """Looks up every beatmap and user at once so preparing each item only hits the cache"""
+        beatmap_ids = set()
+        user_ids = set()
+        for _, data in items:
+            for mappool in self._get_mappools(data):
+                beatmap_ids.update(beatmap["id"] for beatmap in mappool["beatmaps"])
+            if data["type"] == "tournament":
+                user_ids.update(user["id"] for user in data["staff"])
+
+        for batch in itertools.batched(beatmap_ids, PREFETCH_SIZE):
+            await beatmap_resolver.get_beatmaps(batch)
+        for batch in itertools.batched(user_ids, PREFETCH_SIZE):
+            await user_resolver.get_users(batch)
+
+    @staticmethod
+    async def _prepare_mappool(mappool: dict) -> tuple:
+        beatmaps = mappool["beatmaps"]
+        data = await Mappool.get_rows_data(
+            [beatmap["id"] for beatmap in beatmaps],
+            [beatmap["mods"] for beatmap in beatmaps]
+        )
+        return (
+            mappool["name"],
+            mappool.get("description") or "",
+            [beatmap["slot"].upper() for beatmap in beatmaps],
+            data
+        )
+
+    async def _prepare(self, semaphore: asyncio.Semaphore, data: dict) -> tuple:
+        """Resolves everything needed to write an item without touching the osu api"""
+        async with semaphore:
+            if data["type"] == "mappool":
+                return await self._prepare_mappool(data)
+
+            mappools = []
+            for mappool in data["mappools"]:
+                new_mappool = None
+                if mappool.get("mappool") is not None:
+                    new_mappool = await self._prepare_mappool(mappool["mappool"])
+                mappools.append((mappool.get("name_override"), mappool.get("id"), new_mappool))
+
+            return (
+                data["name"],
+                data.get("abbreviation") or "",
+                data.get("description") or "",
+                data.get("link") or "",
+                await Tournament.get_users_data(data["staff"]),
+                [user["roles"] for user in data["staff"]],
+                mappools
+            )
+
+    def _write_mappool(self, name: str, description: str, slots: list[str], data: list) -> int:
+        mappool = Mappool._new_mappool(Mappool, 0, name, description, slots, self.submitted_by, data)
+        self.mappools += 1
+        return mappool.id
+
+    def _write(self, data: dict, prepared: tuple):
+        if data["type"] == "mappool":
+            self._write_mappool(*prepared)
+            return
+
+        name, abbr, description, link, users, roles, mappools = prepared
+        mappool_connections = [
+            (name_override, mappool_id if new_mappool is None else self._write_mappool(*new_mappool))
+            for name_override, mappool_id, new_mappool in mappools
+        ]
+        Tournament._new_tournament(
+            Tournament,
+            name,
+            abbr,
+            description,
+            link,
+            None if self.submitted_by is None else self.submitted_by.id,
+            users,
+            roles,
+            mappool_connections
+        )
+        self.tournaments += 1
+
+    def _write_chunk(self, chunk: list[tuple[int, dict, tuple]]):
+        with transaction.atomic():
+            # foreign keys are checked per line instead of when the whole chunk commits
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+            for line_number, data, prepared in chunk:
+                mappools, tournaments = self.mappools, self.tournaments
+                try:
+                    # a savepoint, so one bad line doesn't undo the rest of the chunk
+                    with transaction.atomic():
+                        self._write(data, prepared)
+                except DatabaseError as exc:
+                    self.mappools, self.tournaments = mappools, tournaments
+                    self.errors.append((line_number, str(exc).strip().split("\n")[0]))
+
+    async def _run_batch(self, semaphore: asyncio.Semaphore, items: tuple[tuple[int, dict], ...]):
+        await self._prefetch(items)
+
+        for chunk in itertools.batched(items, self.chunk_size):
+            results = await asyncio.gather(
+                *(self._prepare(semaphore, data) for _, data in chunk),
+                return_exceptions=True
+            )
+
+            prepared = []
+            for (line_number, data), result in zip(chunk, results):
+                if isinstance(result, ExpectedException):
+                    self.errors.append((line_number, result.args[0]))
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    prepared.append((line_number, data, result))
+
+            await sync_to_async(self._write_chunk)(prepared)
+            await listing_counts.invalidate()
+
+    async def run(self, lines: AsyncIterable[str | bytes]):
+        """Imports lines, e.g. from read_lines"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async for items in _batched(self.parse(lines), BATCH_SIZE):
+            await self._run_batch(semaphore, items)
+
+        self.errors.sort()
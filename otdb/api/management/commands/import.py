@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from api.importer import Importer, read_lines
+from database.models import beatmap_cache
+
+import asyncio
+import sys
+
+
+OsuUser = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Imports mappools and tournaments from an ndjson file, one per line"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="Path to the ndjson file, or - for stdin")
+        parser.add_argument(
+            "--submitted-by",
+            type=int,
+            help="osu user id to show as the submitter (must have logged in before)"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100,
+            help="Lines written per transaction"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Mappools and tournaments prepared at the same time"
+        )
+
+    async def _import(self, importer: Importer, file):
+        try:
+            await importer.run(read_lines(file))
+        finally:
+            await beatmap_cache.close()
+
+    def handle(self, *args, **options):
+        submitted_by = None
+        if options["submitted_by"] is not None:
+            try:
+                submitted_by = OsuUser.objects.get(id=options["submitted_by"])
+            except OsuUser.DoesNotExist:
+                raise CommandError(f"No user with id {options['submitted_by']}")
+
+        importer = Importer(submitted_by, options["chunk_size"], options["concurrency"])
+        if options["file"] == "-":
+            asyncio.run(self._import(importer, sys.stdin))
+        else:
+            with open(options["file"], encoding="utf-8") as f:
+                asyncio.run(self._import(importer, f))
+
+        for line_number, msg in importer.errors:
+            self.stderr.write(f"Line {line_number}: {msg}")
+        self.stdout.write(
+            f"Imported {importer.mappools} mappool(s) and {importer.tournaments} tournament(s) "
+            f"({len(importer.errors)} line(s) failed)"
+        )
@@ -3,8 +3,10 @@ from django.conf import settings
 
 from asgiref.sync import sync_to_async
 import pytest
+import pytest_asyncio
 
 from main.models import OsuUser
+from database.models import beatmap_cache
 
 
 USER = {
@@ -68,7 +70,8 @@ def create_user():
         id=USER["id"],
         username=USER["username"],
         avatar=USER["avatar"],
-        cover=USER["cover"]
+        cover=USER["cover"],
+        is_admin=USER["is_admin"]
     )
     user.save()
 
@@ -79,6 +82,13 @@ def django_db_setup(django_db_setup, django_db_blocker):
         create_user()
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def close_event_loop_resources():
+    yield
+    # every test gets its own event loop, and tasks can't outlive theirs
+    await beatmap_cache.close()
+
+
 @pytest.fixture
 def sample_mappool():
     return {
@@ -0,0 +1,205 @@
+import pytest
+import pytest_asyncio
+import asyncio
+import hashlib
+import os
+
+from common.cache import LRUCache
+from database import difficulty, models
+from database.models import BeatmapCacheManager, BeatmapDifficultyAttributes, BeatmapResolver, ResolvedBeatmap
+
+
+OSU_FILE = b"""osu file format v14
+
+[General]
+Mode: 0
+
+[Difficulty]
+HPDrainRate:5
+CircleSize:4
+OverallDifficulty:8
+ApproachRate:9
+SliderMultiplier:1.4
+SliderTickRate:1
+
+[TimingPoints]
+0,500,4,2,0,100,1,0
+
+[HitObjects]
+256,192,1000,1,0,0:0:0:0:
+320,192,1500,1,0,0:0:0:0:
+"""
+
+
+def make_beatmap(data: bytes = OSU_FILE, beatmap_id: int = 1) -> ResolvedBeatmap:
+    return ResolvedBeatmap(
+        id=beatmap_id,
+        checksum=hashlib.md5(data).hexdigest(),
+        mode="osu",
+        version="test",
+        ar=9,
+        accuracy=8,
+        cs=4,
+        drain=5,
+        total_length=1,
+        bpm=120,
+        beatmapset_id=1,
+        artist="artist",
+        title="title",
+        creator="creator",
+        fetched_at=None
+    )
+
+
+class FakeSite:
+    """Stands in for downloads from osu.ppy.sh"""
+
+    def __init__(self, data: bytes = OSU_FILE):
+        self.data = data
+        self.requests = 0
+
+    async def request(self, beatmap):
+        self.requests += 1
+        return self.data
+
+
+@pytest_asyncio.fixture
+async def cache_manager(tmp_path, monkeypatch, settings):
+    settings.BEATMAP_CALC_EXECUTOR = "thread"
+    monkeypatch.setattr(BeatmapCacheManager, "CACHE_DIR", str(tmp_path))
+
+    manager = BeatmapCacheManager()
+    site = FakeSite()
+    monkeypatch.setattr(manager, "_request_beatmap", site.request)
+
+    # common mods are calculated after a download; not what these tests are about
+    async def precompute(beatmap):
+        pass
+
+    monkeypatch.setattr(manager, "_precompute", precompute)
+
+    yield manager, site
+    await manager.close()
+
+
+class CountingClient:
+    """Counts the beatmaps requested from the osu api, which leaves out ones that don't exist"""
+
+    def __init__(self, client):
+        self.client = client
+        self.requested = []
+
+    async def get_beatmaps(self, beatmap_ids):
+        self.requested.extend(beatmap_ids)
+        known = {beatmap["id"] for beatmap in self.client.beatmap_data}
+        return await self.client.get_beatmaps([beatmap_id for beatmap_id in beatmap_ids if beatmap_id in known])
+
+
+class TestLRUCache:
+    def test_evicts_by_size(self):
+        cache = LRUCache(10)
+        cache.set("a", 1, 4)
+        cache.set("b", 2, 4)
+        cache.get("a")
+        cache.set("c", 3, 4)
+
+        assert "b" not in cache, "expected the least recently used entry to be evicted"
+        assert "a" in cache and "c" in cache, "expected the other entries to stay"
+        assert cache.size == 8 and cache.evictions == 1
+
+        # bigger than the whole cache, so it's not kept and nothing is evicted for it
+        cache.set("d", 4, 11)
+        assert "d" not in cache and len(cache) == 2 and cache.evictions == 1
+
+    def test_parsed_beatmaps(self, tmp_path, settings):
+        other_file = OSU_FILE.replace(b"OverallDifficulty:8", b"OverallDifficulty:7")
+        paths = []
+        for i, data in enumerate((OSU_FILE, other_file)):
+            paths.append((str(tmp_path / f"{i}.osu.zlib"), hashlib.md5(data).hexdigest()))
+            BeatmapCacheManager._write(paths[-1][0], data)
+
+        # room for one parsed beatmap
+        difficulty.parsed_beatmaps.clear()
+        difficulty.configure(len(OSU_FILE) * difficulty.PARSED_SIZE_FACTOR)
+        evictions = difficulty.parsed_beatmaps.evictions
+        try:
+            for path, checksum in paths:
+                difficulty.calculate(path, checksum, 0)
+
+            assert paths[0][1] not in difficulty.parsed_beatmaps, "expected the first beatmap to be evicted"
+            assert paths[1][1] in difficulty.parsed_beatmaps, "expected the last beatmap to stay"
+            assert difficulty.parsed_beatmaps.evictions == evictions + 1
+        finally:
+            difficulty.parsed_beatmaps.clear()
+            difficulty.configure(settings.BEATMAP_PARSED_CACHE_SIZE)
+
+
+@pytest.mark.django_db
+class TestBeatmapResolver:
+    @pytest.mark.asyncio
+    async def test_missing_beatmaps(self, monkeypatch, settings):
+        osu_client = CountingClient(models.osu_client)
+        monkeypatch.setattr(models, "osu_client", osu_client)
+        resolver = BeatmapResolver()
+        missing_id = 1
+
+        assert (await resolver.get_beatmaps([missing_id]))[missing_id] is None, "expected no beatmap"
+        assert osu_client.requested == [missing_id]
+
+        # remembered as missing
+        assert (await resolver.get_beatmaps([missing_id]))[missing_id] is None, "expected no beatmap"
+        assert osu_client.requested == [missing_id], "expected the missing beatmap to not be requested again"
+
+        # until that expires
+        settings.BEATMAP_METADATA_MISSING_TTL = 0
+        resolver = BeatmapResolver()
+        await resolver.get_beatmaps([missing_id])
+        await resolver.get_beatmaps([missing_id])
+        assert osu_client.requested == [missing_id] * 3, "expected the missing beatmap to be requested again"
+
+        # beatmaps that exist are remembered too
+        beatmap_id = osu_client.client.beatmap_data[0]["id"]
+        assert (await resolver.get_beatmaps([beatmap_id]))[beatmap_id].id == beatmap_id
+        requested = len(osu_client.requested)
+        assert (await resolver.get_beatmaps([beatmap_id]))[beatmap_id].id == beatmap_id
+        assert len(osu_client.requested) == requested, "expected the beatmap to come from memory"
+
+
+@pytest.mark.django_db
+class TestBeatmapCache:
+    @pytest.mark.asyncio
+    async def test_shared_download(self, cache_manager):
+        manager, site = cache_manager
+        beatmap = make_beatmap()
+
+        paths = await asyncio.gather(*(manager.ensure_cached(beatmap) for _ in range(5)))
+        assert site.requests == 1, "expected concurrent requests to share one download"
+        assert len(set(paths)) == 1 and os.path.exists(paths[0])
+
+        await manager.ensure_cached(beatmap)
+        assert site.requests == 1, "expected the cached file to be used"
+
+        await manager.ensure_cached(beatmap, invalidate=True)
+        assert site.requests == 2, "expected an invalidated file to be downloaded again"
+
+    @pytest.mark.asyncio
+    async def test_refetch_pruned_beatmap(self, cache_manager):
+        manager, site = cache_manager
+        beatmap = make_beatmap()
+
+        # the file is pruned after it's known to be cached, but before a worker opens it
+        run_calculation = manager._run_calculation
+
+        async def run_after_prune(func, path, *args):
+            if site.requests == 1:
+                os.remove(path)
+            return await run_calculation(func, path, *args)
+
+        manager._run_calculation = run_after_prune
+
+        try:
+            difficulty = await manager.get_beatmap_attributes(beatmap, 0)
+            assert difficulty.star_rating > 0, "expected the beatmap to be calculated"
+            assert site.requests == 2, "expected the pruned beatmap to be downloaded again"
+        finally:
+            await BeatmapDifficultyAttributes.objects.filter(checksum=beatmap.checksum).adelete()
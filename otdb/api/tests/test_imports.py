@@ -0,0 +1,57 @@
+import pytest
+import json
+
+from .util import parse_resp
+from ..views import imports, mappools
+from database.models import Mappool, Tournament
+
+
+@pytest.mark.django_db
+class TestImports:
+    @pytest.mark.asyncio
+    async def test_bulk_import(self, client, sample_mappool, sample_tournament):
+        mappool = {**sample_mappool, "type": "mappool", "name": "imported mappool"}
+        tournament = {
+            **sample_tournament,
+            "type": "tournament",
+            "name": "imported tournament",
+            "mappools": [{"mappool": {**sample_mappool, "name": "imported tournament mappool"}, "name_override": "QF"}]
+        }
+        lines = [json.dumps(mappool), "not json", json.dumps(tournament), json.dumps({"type": "beatmap"})]
+
+        req = await client.post("/api/import/", data="\n".join(lines), content_type="application/x-ndjson")
+        result = parse_resp(await imports.bulk_import(req))
+
+        try:
+            assert result["mappools"] == 2, "expected both mappools to be imported"
+            assert result["tournaments"] == 1, "expected the tournament to be imported"
+            assert [error["line"] for error in result["errors"]] == [2, 4], "expected invalid lines to be reported"
+
+            imported = await Tournament.objects.prefetch_related("mappool_connections").aget(name="imported tournament")
+            connections = list(imported.mappool_connections.all())
+            assert len(connections) == 1 and connections[0].name_override == "QF", "missing tournament mappool"
+
+            # mappools are searchable by the tournaments they're in
+            req = await client.get("/api/mappools/?q=QF imported")
+            found = parse_resp(await mappools.mappools(req))["data"]
+            assert [m["name"] for m in found] == ["imported tournament mappool"], "expected to find the mappool by its tournament"
+        finally:
+            # keep listings in the other tests to what they create
+            await Tournament.objects.filter(name="imported tournament").adelete()
+            await Mappool.objects.filter(
+                name__in=("imported mappool", "imported tournament mappool")
+            ).adelete()
+
+    @pytest.mark.asyncio
+    async def test_bulk_import_limits(self, client, settings):
+        settings.IMPORT_MAX_LINES = 2
+        settings.IMPORT_MAX_LINE_SIZE = 50
+        lines = ["[" + "0, " * 50 + "0]", "{}", "{}"]
+
+        req = await client.post("/api/import/", data="\n".join(lines), content_type="application/x-ndjson")
+        result = parse_resp(await imports.bulk_import(req))
+
+        assert result["mappools"] == 0 and result["tournaments"] == 0, "expected nothing to be imported"
+        assert [error["line"] for error in result["errors"]] == [1, 2, 3], "expected every line to be reported"
+        assert "longer" in result["errors"][0]["error"], "expected the first line to be too long"
+        assert "first 2 lines" in result["errors"][2]["error"], "expected lines past the limit to be reported"
@@ -1,8 +1,14 @@
 import json
+import time
 import pytest
 
+from django.core.cache import cache
+
 from .util import parse_resp, get_total_pages
-from .. import views
+from ..views import mappools as views
+from ..views.listing import encode_cursor, listing_counts
+from database.models import Mappool, MappoolFavorite, get_trending_weight
+from common.exceptions import ClientException
 
 
 @pytest.mark.django_db
@@ -28,6 +34,11 @@ class TestMappools:
         req = await client.post(f"/api/mappools/{mappool['id']}/favorite/", data=json.dumps({"favorite": True}))
         parse_resp(await views.favorite_mappool(req, mappool["id"]))
 
+        # ln(1 + exp(weight)), which is just the weight for any current timestamp
+        stored = await Mappool.objects.aget(id=mappool["id"])
+        assert stored.trending_score == pytest.approx(get_trending_weight(int(time.time())), abs=1e-3), \
+            "expected the favorite's weight to be added to the trending score"
+
     @pytest.mark.asyncio
     @pytest.mark.dependency(depends=["TestMappools::test_create_mappool"])
     async def test_get_mappool(self, client, sample_mappool):
@@ -97,6 +108,53 @@ class TestMappools:
             await self._get_mappools_listing(client, {"s": "trending"})
         )
 
+    @pytest.mark.asyncio
+    @pytest.mark.dependency(depends=["TestMappools::test_create_mappool"])
+    async def test_cursor_list(self, client):
+        mappool_id = client.mappool["id"]
+
+        req = await client.get("/api/mappools/?s=recent")
+        assert parse_resp(await views.mappools(req))["next_cursor"] is None, "expected no page after the only one"
+
+        # starting after a newer mappool includes it, starting after itself doesn't
+        for cursor_id, expected in ((mappool_id + 1, 1), (mappool_id, 0)):
+            cursor = encode_cursor("recent", cursor_id, cursor_id)
+            req = await client.get(f"/api/mappools/?s=recent&cursor={cursor}")
+            result = parse_resp(await views.mappools(req))
+
+            assert len(result["data"]) == expected
+            assert result["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_list_limits(self, client, settings):
+        req = await client.get(f"/api/mappools/?s=recent&p={settings.LISTING_MAX_PAGE + 1}")
+        with pytest.raises(ClientException, match="cursor"):
+            await views.mappools(req)
+
+        req = await client.get("/api/mappools/?s=relevance")
+        with pytest.raises(ClientException, match="search query"):
+            await views.mappools(req)
+
+    @pytest.mark.asyncio
+    async def test_count_version(self):
+        version = await listing_counts.get_version()
+        await listing_counts.invalidate()
+        assert await listing_counts.get_version() == version + 1, "expected a write to bump the version"
+
+        # evicted from the cache; a version that counts were stored under can't come back
+        await cache.adelete(listing_counts.VERSION_KEY)
+        await listing_counts.invalidate()
+        assert await listing_counts.get_version() > version + 1, "expected a new version after eviction"
+
+    @pytest.mark.asyncio
+    @pytest.mark.dependency(depends=["TestMappools::test_create_mappool"])
+    async def test_list_without_count(self, client):
+        req = await client.get("/api/mappools/?s=recent&count=0")
+        result = parse_resp(await views.mappools(req))
+
+        self._test_mappool_listing(client, result["data"])
+        assert result["total_pages"] is None, "expected pages to not be counted"
+
     @pytest.mark.asyncio
     @pytest.mark.dependency(depends=["TestMappools::test_create_mappool"])
     async def test_sr_filter(self, client):
@@ -142,3 +200,37 @@ class TestMappools:
 
             assert isinstance(mappools, list), "expected a list"
             assert len(mappools) == 0, "expected empty return"
+
+    @pytest.mark.asyncio
+    @pytest.mark.dependency(depends=["TestMappools::test_favorite_mappool"])
+    async def test_unfavorite_mappool(self, client):
+        mappool = client.mappool
+
+        req = await client.post(f"/api/mappools/{mappool['id']}/favorite/", data=json.dumps({"favorite": False}))
+        parse_resp(await views.favorite_mappool(req, mappool["id"]))
+
+        stored = await Mappool.objects.aget(id=mappool["id"])
+        assert stored.favorite_count == 0, "expected the favorite to be taken off the favorite count"
+        assert stored.trending_score == 0, "expected the favorite's weight to be taken off the trending score"
+
+    @pytest.mark.asyncio
+    @pytest.mark.dependency(depends=["TestMappools::test_unfavorite_mappool"])
+    async def test_favorite_twice(self, client):
+        mappool = await Mappool.objects.aget(id=client.mappool["id"])
+        user = await client.get_user()
+
+        try:
+            # e.g. two requests that both saw no favorite yet
+            await mappool.add_favorite(user.id)
+            await mappool.add_favorite(user.id)
+            stored = await Mappool.objects.aget(id=mappool.id)
+            assert stored.favorite_count == 1, "expected only the first favorite to be counted"
+
+            # a count that drifted can't go below 0
+            await Mappool.objects.filter(id=mappool.id).aupdate(favorite_count=0)
+            await mappool.remove_favorite(await MappoolFavorite.objects.aget(mappool_id=mappool.id, user_id=user.id))
+            stored = await Mappool.objects.aget(id=mappool.id)
+            assert stored.favorite_count == 0, "expected the favorite count to stay at 0"
+        finally:
+            await MappoolFavorite.objects.filter(mappool_id=mappool.id).adelete()
+            await Mappool.objects.filter(id=mappool.id).aupdate(favorite_count=0, trending_score=0)
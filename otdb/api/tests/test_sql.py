@@ -0,0 +1,196 @@
+import pytest
+import importlib
+import json
+
+from django.apps import apps
+from django.utils import timezone
+
+from .util import parse_resp
+from ..views import mappools, tournaments
+from database.models import (
+    BeatmapMetadata,
+    BeatmapMod,
+    BeatmapsetMetadata,
+    Mappool,
+    MappoolBeatmap,
+    MappoolBeatmapConnection,
+    Tournament,
+    TournamentInvolvement
+)
+from main.models import OsuUser
+
+
+def make_mappool(name: str, beatmaps: list[tuple[int, str, list[str]]]) -> dict:
+    return {
+        "name": name,
+        "description": "",
+        "beatmaps": [{"id": beatmap_id, "slot": slot, "mods": mods} for beatmap_id, slot, mods in beatmaps]
+    }
+
+
+async def create_mappool(client, data: dict, mappool_id: int | None = None) -> int:
+    if mappool_id is not None:
+        data = {**data, "id": mappool_id}
+    req = await client.post("/api/mappools/", data=json.dumps(data))
+    return parse_resp(await mappools.mappools(req))["id"]
+
+
+async def get_connections(mappool_id: int) -> dict[str, MappoolBeatmapConnection]:
+    return {
+        connection.slot: connection
+        async for connection in MappoolBeatmapConnection.objects.filter(mappool_id=mappool_id).select_related("beatmap")
+    }
+
+
+async def get_avg_star_rating(mappool_id: int) -> float:
+    ratings = [
+        star_rating async for star_rating in MappoolBeatmap.objects.filter(
+            mappool_connections__mappool_id=mappool_id
+        ).values_list("star_rating", flat=True)
+    ]
+    return sum(ratings) / len(ratings)
+
+
+@pytest.mark.django_db
+class TestNewMappool:
+    @pytest.mark.asyncio
+    async def test_shared_star_rating(self, client):
+        mappool_ids = []
+
+        try:
+            mappool_ids.append(await create_mappool(client, make_mappool("shared star rating 1", [
+                (3993830, "NM1", []),
+                (4021669, "NM2", [])
+            ])))
+            shared = await MappoolBeatmap.objects.aget(
+                beatmap_metadata_id=3993830,
+                mappool_connections__mappool_id=mappool_ids[0]
+            )
+
+            # rated by an older calculator, then submitted again in another mappool
+            await MappoolBeatmap.objects.filter(id=shared.id).aupdate(star_rating=shared.star_rating + 10)
+            await Mappool.objects.filter(id=mappool_ids[0]).aupdate(
+                avg_star_rating=await get_avg_star_rating(mappool_ids[0])
+            )
+            mappool_ids.append(await create_mappool(client, make_mappool("shared star rating 2", [
+                (3993830, "NM1", [])
+            ])))
+
+            assert (await MappoolBeatmap.objects.aget(id=shared.id)).star_rating == pytest.approx(shared.star_rating), \
+                "expected the shared beatmap to be rated again"
+            for mappool_id in mappool_ids:
+                mappool = await Mappool.objects.aget(id=mappool_id)
+                assert mappool.avg_star_rating == pytest.approx(await get_avg_star_rating(mappool_id)), \
+                    "expected every mappool using the shared beatmap to have its average updated"
+        finally:
+            await Mappool.objects.filter(id__in=mappool_ids).adelete()
+
+    @pytest.mark.asyncio
+    async def test_edit_slots(self, client):
+        mappool_id = None
+
+        try:
+            mappool_id = await create_mappool(client, make_mappool("edit slots", [
+                (3993830, "NM1", []),
+                (4021669, "NM2", []),
+                (2964073, "NM3", [])
+            ]))
+            before = await get_connections(mappool_id)
+
+            await create_mappool(client, make_mappool("edit slots", [
+                (3993830, "NM1", []),
+                (3316178, "NM2", []),
+                (4031511, "NM4", [])
+            ]), mappool_id)
+            after = await get_connections(mappool_id)
+
+            assert set(after) == {"NM1", "NM2", "NM4"}, "expected only the removed slot to be deleted"
+            assert after["NM1"].id == before["NM1"].id, "expected an unchanged slot to be left alone"
+            assert after["NM2"].id == before["NM2"].id and after["NM2"].beatmap.beatmap_metadata_id == 3316178, \
+                "expected a changed slot to be updated in place"
+            assert after["NM4"].beatmap.beatmap_metadata_id == 4031511
+        finally:
+            if mappool_id is not None:
+                await Mappool.objects.filter(id=mappool_id).adelete()
+
+
+@pytest.mark.django_db
+class TestNewTournament:
+    @pytest.mark.asyncio
+    async def test_edit_staff(self, client, sample_tournament):
+        # stored recently, so it's not looked up on the osu api
+        other_user = await OsuUser.objects.acreate(
+            id=1,
+            username="other user",
+            avatar="",
+            cover="",
+            fetched_at=timezone.now()
+        )
+        tournament_id = None
+
+        try:
+            data = {
+                **sample_tournament,
+                "name": "edit staff",
+                "staff": [{"id": 14895608, "roles": 1}, {"id": other_user.id, "roles": 1}]
+            }
+            req = await client.post("/api/tournaments/", data=json.dumps(data))
+            tournament_id = parse_resp(await tournaments.tournaments(req))["id"]
+            before = {
+                involvement.user_id: involvement
+                async for involvement in TournamentInvolvement.objects.filter(tournament_id=tournament_id)
+            }
+
+            data = {**data, "id": tournament_id, "staff": [{"id": 14895608, "roles": 3}]}
+            req = await client.post("/api/tournaments/", data=json.dumps(data))
+            parse_resp(await tournaments.tournaments(req))
+            after = {
+                involvement.user_id: involvement
+                async for involvement in TournamentInvolvement.objects.filter(tournament_id=tournament_id)
+            }
+
+            assert set(after) == {14895608}, "expected only the removed staff to be deleted"
+            assert after[14895608].id == before[14895608].id and after[14895608].roles == 3, \
+                "expected changed roles to be updated in place"
+        finally:
+            if tournament_id is not None:
+                await Tournament.objects.filter(id=tournament_id).adelete()
+            await other_user.adelete()
+
+
+class TestBackfillSignatures:
+    @pytest.mark.django_db
+    def test_merge_duplicates(self):
+        migration = importlib.import_module("database.migrations.0018_backfill_mappoolbeatmap_signature")
+
+        beatmapset = BeatmapsetMetadata.objects.create(id=1, artist="artist", title="title", creator="creator")
+        beatmap = BeatmapMetadata.objects.create(
+            id=1, difficulty="test", ar=9, od=8, cs=4, hp=5, length=1, bpm=120
+        )
+        mod = BeatmapMod.objects.get_or_create(acronym="EZ", settings={})[0]
+
+        # made before signatures existed, the constraint on them is why they differ here
+        mappool_beatmaps = []
+        for signature in ("duplicate 1", "duplicate 2"):
+            mappool_beatmap = MappoolBeatmap.objects.create(
+                beatmapset_metadata=beatmapset,
+                beatmap_metadata=beatmap,
+                star_rating=1,
+                signature=signature
+            )
+            mappool_beatmap.mods.add(mod)
+            mappool_beatmaps.append(mappool_beatmap)
+
+        mappool_ids = []
+        for i, mappool_beatmap in enumerate(mappool_beatmaps):
+            mappool = Mappool.objects.create(name=f"duplicate {i}", avg_star_rating=1)
+            MappoolBeatmapConnection.objects.create(mappool=mappool, beatmap=mappool_beatmap, slot="EZ1")
+            mappool_ids.append(mappool.id)
+
+        migration.backfill_signatures(apps, None)
+
+        kept = MappoolBeatmap.objects.get(beatmap_metadata=beatmap)
+        assert kept.id == mappool_beatmaps[0].id and kept.signature == "EZ", "expected the duplicates to be merged"
+        assert list(
+            MappoolBeatmapConnection.objects.filter(mappool_id__in=mappool_ids).values_list("beatmap_id", flat=True)
+        ) == [kept.id] * 2, "expected both mappools to use the kept beatmap"
@@ -2,7 +2,7 @@ import pytest
 import json
 
 from .util import parse_resp, get_total_pages
-from .. import views
+from ..views import tournaments as views
 
 
 @pytest.mark.django_db
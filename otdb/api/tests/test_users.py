@@ -1,7 +1,14 @@
 import pytest
 
+from django.conf import settings
+from django.utils import timezone
+
+from datetime import timedelta
+
 from .util import parse_resp
-from .. import views
+from ..views import users as views
+from database import models
+from main.models import OsuUser
 
 
 @pytest.mark.django_db
@@ -16,3 +23,45 @@ class TestUsers:
         assert user["username"] == sample_user["username"], "username is incorrect"
         assert user["avatar"] == sample_user["avatar"], "avatar is incorrect"
         assert user["cover"] == sample_user["cover"], "cover is incorrect"
+
+
+class CountingClient:
+    """Counts the users requested from the osu api"""
+
+    def __init__(self, client):
+        self.client = client
+        self.requested = []
+
+    async def get_users(self, user_ids):
+        self.requested.extend(user_ids)
+        return await self.client.get_users(user_ids)
+
+
+@pytest.mark.django_db
+class TestUserResolver:
+    @pytest.mark.asyncio
+    async def test_stored_users(self, monkeypatch, sample_user):
+        osu_client = CountingClient(models.osu_client)
+        monkeypatch.setattr(models, "osu_client", osu_client)
+        user_id = sample_user["id"]
+
+        try:
+            # never fetched, so it's requested and stored
+            await OsuUser.objects.filter(id=user_id).aupdate(fetched_at=None)
+            users = await models.UserResolver().get_users([user_id])
+            assert users[user_id][1] == sample_user["username"], "username is incorrect"
+            assert osu_client.requested == [user_id], "expected a user that was never fetched to be requested"
+            assert (await OsuUser.objects.aget(id=user_id)).fetched_at is not None, "expected the user to be stored"
+
+            # a new resolver has nothing in memory, but the stored user is recent
+            users = await models.UserResolver().get_users([user_id])
+            assert users[user_id][1] == sample_user["username"], "username is incorrect"
+            assert osu_client.requested == [user_id], "expected the stored user to be used"
+
+            await OsuUser.objects.filter(id=user_id).aupdate(
+                fetched_at=timezone.now() - timedelta(seconds=settings.USER_REFRESH_INTERVAL + 1)
+            )
+            await models.UserResolver().get_users([user_id])
+            assert osu_client.requested == [user_id, user_id], "expected a stale stored user to be requested"
+        finally:
+            await OsuUser.objects.filter(id=user_id).aupdate(fetched_at=None)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import tournaments, mappools, users
+from .views import tournaments, mappools, users, imports
 
 urlpatterns = [
     # tournaments
@@ -14,4 +14,7 @@ urlpatterns = [
 
     # users
     path("users/<int:id>/", users.users),
+
+    # admin
+    path("import/", imports.bulk_import),
 ]
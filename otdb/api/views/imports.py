@@ -0,0 +1,27 @@
+from django.conf import settings
+
+from .util import *
+from ..importer import Importer, read_lines
+
+
+__all__ = (
+    "bulk_import",
+)
+
+
+@require_method("POST")
+@requires_admin
+async def bulk_import(req):
+    """Takes ndjson of mappools and tournaments, see Importer"""
+    importer = Importer(
+        await req.auser(),
+        max_lines=settings.IMPORT_MAX_LINES,
+        max_line_size=settings.IMPORT_MAX_LINE_SIZE
+    )
+    await importer.run(read_lines(req, settings.IMPORT_MAX_LINE_SIZE))
+
+    return JsonResponse({
+        "mappools": importer.mappools,
+        "tournaments": importer.tournaments,
+        "errors": [{"line": line_number, "error": msg} for line_number, msg in importer.errors]
+    }, safe=False)
@@ -1,15 +1,84 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models.functions import Cast
 from django.contrib.postgres import search
+from django.core.cache import cache
+from django.conf import settings
+
+from common.cache import LRUCache
+from common.exceptions import ClientException
 
 from asgiref.sync import sync_to_async
 from typing import Type, TypeVar
+import base64
+import json
 import time
 
-from .util import option_query_param, int_query_param
+from .util import option_query_param, int_query_param, transform_query_param
 
 
 _T = TypeVar('_T', bound=type[models.Model])
 LISTING_ITEMS_PER_PAGE = 15
+# below this many rows, counting a whole table is cheap enough to not estimate it
+ESTIMATE_MIN_ROWS = 10000
+# has to match the config search vectors are made with in sql/search_vectors.sql
+SEARCH_CONFIG = "english"
+
+
+def encode_cursor(sort: str, value, id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort, value, id]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int | float, int]:
+    sort, value, id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    if not isinstance(sort, str) or not isinstance(value, (int, float)) or not isinstance(id, int):
+        raise ValueError("Invalid cursor")
+
+    return sort, value, id
+
+
+class ListingCounts:
+    """Total item counts of listings, reused between requests for a short time.
+
+    Counts are stored under the version they were counted at, and every mappool or
+    tournament write bumps the version, so a count from before a write is never used.
+    The version is kept in django's cache; it's only shared between processes when the
+    cache is (see CACHES in settings), otherwise their counts are out of date until they expire."""
+
+    __slots__ = ("_counts",)
+
+    VERSION_KEY = "listing_counts_version"
+
+    def __init__(self):
+        # (version, key) -> (count, expiry time)
+        self._counts = LRUCache(settings.LISTING_COUNT_CACHE_SIZE)
+
+    async def get_version(self) -> int:
+        version = await cache.aget(self.VERSION_KEY)
+        if version is None:
+            # starting from the time means a version evicted from the cache is never repeated
+            await cache.aadd(self.VERSION_KEY, time.time_ns(), timeout=None)
+            version = await cache.aget(self.VERSION_KEY)
+
+        return version
+
+    async def invalidate(self):
+        try:
+            await cache.aincr(self.VERSION_KEY)
+        except ValueError:
+            # not in the cache, so no count was stored under a version it can be confused with
+            await cache.aadd(self.VERSION_KEY, time.time_ns(), timeout=None)
+
+    def get(self, version: int, key: tuple) -> int | None:
+        entry = self._counts.get((version, key))
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def set(self, version: int, key: tuple, count: int):
+        self._counts.set((version, key), (count, time.monotonic() + settings.LISTING_COUNT_CACHE_TTL))
+
+
+listing_counts = ListingCounts()
 
 
 class ListingSort:
@@ -23,22 +92,36 @@ class ListingSort:
     def __str__(self):
         return ("-" if self._desc else "+") + self._column
 
+    @property
+    def ordering(self) -> tuple[str, ...]:
+        # id breaks ties, so every row has a fixed position to seek from
+        if self._column == "id":
+            return (str(self),)
+        return str(self), ("-" if self._desc else "") + "id"
+
+    def get_value(self, obj):
+        return getattr(obj, self._column)
+
+    def after(self, value, id: int) -> models.Q:
+        """Rows that come after (value, id) in this order"""
+        lookup = "lt" if self._desc else "gt"
+        if self._column == "id":
+            return models.Q(**{f"id__{lookup}": id})
+
+        return models.Q(**{f"{self._column}__{lookup}": value}) | \
+            models.Q(**{self._column: value, f"id__{lookup}": id})
+
 
 class Listing[_T]:
-    __slots__ = ("_model", "sort", "page", "query", "filters", "extra")
+    __slots__ = ("_model", "sort_name", "sort", "page", "cursor", "count", "query", "filters", "extra")
 
     SORT_OPTIONS: dict[str, ListingSort] = {
+        # only when searching
+        "relevance": ListingSort("rank"),
         "recent": ListingSort("id"),
         "favorites": ListingSort("favorite_count"),
-        "trending": ListingSort(
-            "recent_favorites",
-            recent_favorites=models.Count(
-                "favorite_connections",
-                filter=models.Q(favorite_connections__timestamp__gt=time.time() // 1 - 604800)
-            )
-        )
+        "trending": ListingSort("trending_score")
     }
-    SEARCH_FIELDS: tuple[str] = ()
     MODEL: Type[_T]
 
     SORT = option_query_param(
@@ -46,42 +129,105 @@ class Listing[_T]:
         "recent"
     )
     PAGE = int_query_param(range(1, 9999999), 1)
+    CURSOR = transform_query_param(decode_cursor, None)
+    COUNT = int_query_param(range(0, 2), 1)
 
     @property
     def cls(self):
         return self.__class__
 
     def __init__(self, req):
-        self.sort: ListingSort = self.cls.SORT_OPTIONS[self.cls.SORT(req.GET.get("s", "recent").lower())]
-        self.page: int = self.cls.PAGE(req.GET.get("p", 1))
         self.query: str = req.GET.get("q", "").strip()
+        self.sort_name: str = self.cls.SORT(req.GET.get("s", "relevance" if self.query else "recent").lower())
+        if self.sort_name == "relevance" and not self.query:
+            raise ClientException("Sorting by relevance needs a search query")
+        self.sort: ListingSort = self.cls.SORT_OPTIONS[self.sort_name]
+        self.page: int = self.cls.PAGE(req.GET.get("p", 1))
+        # 0 skips counting the total pages, e.g. for clients that only follow cursors
+        self.count: bool = self.cls.COUNT(req.GET.get("count", 1)) == 1
+
+        # seeks from where the previous page ended instead of counting rows from the start;
+        # a cursor from another sort would seek on the wrong column, so it starts over instead
+        self.cursor: tuple | None = self.cls.CURSOR(req.GET.get("cursor", ""))
+        if self.cursor is not None and self.cursor[0] != self.sort_name:
+            self.cursor = None
+        if self.cursor is None and self.page > settings.LISTING_MAX_PAGE:
+            raise ClientException(
+                f"Pages after {settings.LISTING_MAX_PAGE} can only be loaded with the cursor of the page before"
+            )
 
         self.extra = {}
         self.filters = {}
 
         if self.query:
-            self.extra["search"] = search.SearchVector(*self.cls.SEARCH_FIELDS)
-            self.filters["search"] = search.SearchQuery(self.query)
+            query = search.SearchQuery(self.query, config=SEARCH_CONFIG)
+            # ts_rank gives a real, which doesn't come back exactly as the float cursors compare against
+            self.extra["rank"] = Cast(search.SearchRank(models.F("search_vector"), query), models.FloatField())
+            self.filters["search_vector"] = query
+
+    def _get_count_key(self) -> tuple:
+        filters = tuple(sorted((k, v) for k, v in self.filters.items() if k != "search_vector"))
+        return self.MODEL.__name__, filters, " ".join(self.query.lower().split())
 
-    async def aget(self) -> tuple[list[_T], int]:
-        return await sync_to_async(self.get)()
+    def _estimate_rows(self) -> float:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", (self.MODEL._meta.db_table,))
+            row = cursor.fetchone()
 
-    def get(self) -> tuple[list[_T], int]:
-        offset = LISTING_ITEMS_PER_PAGE * (self.page - 1)
+        return 0 if row is None else row[0]
+
+    async def _count(self, query) -> int:
+        if len(self.filters) > 0:
+            return await query.acount()
+
+        # every row is listed when nothing filters them, so the table size is the count
+        rows = await sync_to_async(self._estimate_rows)()
+        if rows >= ESTIMATE_MIN_ROWS:
+            return int(rows)
+
+        return await self.MODEL.objects.acount()
+
+    async def _get_count(self, query) -> int | None:
+        if not self.count:
+            return
+
+        key = self._get_count_key()
+        version = await listing_counts.get_version()
+        count = listing_counts.get(version, key)
+        if count is None:
+            count = await self._count(query)
+            listing_counts.set(version, key, count)
+
+        return count
+
+    async def aget(self) -> tuple[list[_T], int | None, str | None]:
+        """Returns the items, total pages (None if not counted) and a cursor for the page after this one (if there is one)"""
         limit = LISTING_ITEMS_PER_PAGE
 
         query = self.MODEL.objects.annotate(
-            favorite_count=models.Count("favorites"),
             **self.extra,
             **self.sort.extra
         ).filter(
             **self.filters
         )
 
-        result = query.order_by(str(self.sort))[offset:offset + limit]
-        count = query.count()
+        page = query.order_by(*self.sort.ordering)
+        if self.cursor is None:
+            offset = LISTING_ITEMS_PER_PAGE * (self.page - 1)
+            page = page[offset:offset + limit + 1]
+        else:
+            page = page.filter(self.sort.after(*self.cursor[1:]))[:limit + 1]
+
+        result = [obj async for obj in page]
+        count = await self._get_count(query)
+
+        next_cursor = None
+        if len(result) > limit:
+            result = result[:limit]
+            next_cursor = encode_cursor(self.sort_name, self.sort.get_value(result[-1]), result[-1].id)
 
         return (
-            list(result),
-            (count - 1) // LISTING_ITEMS_PER_PAGE + 1
+            result,
+            None if count is None else (count - 1) // LISTING_ITEMS_PER_PAGE + 1,
+            next_cursor
         )
@@ -1,12 +1,10 @@
-from django.contrib.postgres.search import SearchVector, SearchQuery
+from django.conf import settings
 
 from .util import *
-from .listing import Listing
+from .listing import Listing, listing_counts
 from database.models import *
 from common.validation import *
 
-import time
-
 
 __all__ = (
     "get_full_mappool",
@@ -18,16 +16,30 @@ __all__ = (
 
 VALID_MODS = ("EZ", "HD", "HR", "DT", "FM", "RX", "HT", "NC", "FL", "AP", "SO")
 
+MAPPOOL_FORMAT = DictionaryType({
+    "id": IntegerType(minimum=0, optional=True),
+    "name": StringType(range(1, 129)),
+    "description": StringType(range(0, 1024), optional=True),
+    "beatmaps": ListType(
+        DictionaryType({
+            "id": IntegerType(minimum=0),
+            "slot": StringType(range(1, 9)),
+            "mods": ListType(
+                StringType(range(2, 3), options=VALID_MODS),
+                unique=True,
+                unique_check=lambda a, b: a.upper() != b.upper()
+            )
+        }),
+        max_len=32,
+        min_len=1,
+        unique=True,
+        unique_check=lambda a, b: a["id"] != b["id"] and a["slot"].upper() != b["slot"].upper()
+    )
+})
+
 
 class MappoolListing(Listing[Mappool]):
     MODEL = Mappool
-    SEARCH_FIELDS = (
-        "name",
-        "tournament_connections__name_override",
-        "tournament_connections__tournament__name",
-        "tournament_connections__tournament__abbreviation",
-        "tournament_connections__tournament__description"
-    )
 
     MIN_SR = transform_query_param(float, None)
     MAX_SR = transform_query_param(float, None)
@@ -58,17 +70,18 @@ async def get_full_mappool(user, mappool_id) -> dict | None:
     )
 
     try:
-        mappool = await Mappool.objects.annotate(
-            favorite_count=models.Count("favorites")
-        ).prefetch_related(
-            *prefetch
-        ).select_related(
-            *include
-        ).aget(id=mappool_id)
+        mappool = await Mappool.objects.prefetch_related(*prefetch).select_related(*include).aget(id=mappool_id)
     except Mappool.DoesNotExist:
         return
 
+    beatmaps = [connection.beatmap for connection in mappool.beatmap_connections.all()]
+    difficulties = await BeatmapDifficultyAttributes.get_for_mappool_beatmaps(beatmaps)
+
     data = mappool.serialize(includes=include+prefetch+("favorite_count",))
+    # attributes with the mods applied, when they've been calculated
+    for connection in data["beatmap_connections"]:
+        difficulty = difficulties.get(connection["beatmap"]["id"])
+        connection["beatmap"]["difficulty"] = None if difficulty is None else difficulty.serialize()
 
     if user.is_authenticated:
         data["is_favorited"] = await mappool.is_favorited(user.id)
@@ -89,42 +102,23 @@ async def mappools(req, mappool_id=None):
         return JsonResponse(mappool, safe=False) if mappool is not None else \
             error("invalid mappool id", 404)
 
-    mappool_list, total_pages = await MappoolListing(req).aget()
+    mappool_list, total_pages, next_cursor = await MappoolListing(req).aget()
 
     return JsonResponse(
         {
             "data": list((
                 mappool.serialize(includes=["favorite_count"]) for mappool in mappool_list
             )),
-            "total_pages": total_pages
+            "total_pages": total_pages,
+            "next_cursor": next_cursor,
+            "max_page": settings.LISTING_MAX_PAGE
         },
         safe=False
     )
 
 
 @requires_auth
-@accepts_json_data(
-    DictionaryType({
-        "id": IntegerType(minimum=0, optional=True),
-        "name": StringType(range(1, 129)),
-        "description": StringType(range(0, 1024), optional=True),
-        "beatmaps": ListType(
-            DictionaryType({
-                "id": IntegerType(minimum=0),
-                "slot": StringType(range(1, 9)),
-                "mods": ListType(
-                    StringType(range(2, 3), options=VALID_MODS),
-                    unique=True,
-                    unique_check=lambda a, b: a.upper() != b.upper()
-                )
-            }),
-            max_len=32,
-            min_len=1,
-            unique=True,
-            unique_check=lambda a, b: a["id"] != b["id"] and a["slot"].upper() != b["slot"].upper()
-        )
-    })
-)
+@accepts_json_data(MAPPOOL_FORMAT)
 async def create_mappool(req, data):
     beatmap_ids = []
     slots = []
@@ -154,6 +148,7 @@ async def create_mappool(req, data):
         mods,
         mappool_id=data.get("id") or 0
     )
+    await listing_counts.invalidate()
 
     return JsonResponse(mappool.serialize(), safe=False)
 
@@ -169,6 +164,7 @@ async def delete_mappool(req, mappool_id):
         return error("You cannot delete a mappool submitted by another person", 403)
 
     await mappool.adelete()
+    await listing_counts.invalidate()
 
     return HttpResponse(b"", status=200)
 
@@ -194,8 +190,8 @@ async def favorite_mappool(req, mappool_id, data):
         return HttpResponse(b"", 200)
 
     if data["favorite"]:
-        await MappoolFavorite.objects.acreate(mappool_id=mappool.id, user_id=user.id, timestamp=time.time()//1)
+        await mappool.add_favorite(user.id)
     else:
-        await favorite.adelete()
+        await mappool.remove_favorite(favorite)
 
     return HttpResponse(b"", 200)
@@ -1,12 +1,11 @@
 from django.http import Http404
+from django.conf import settings
 
 from .util import *
 from common.validation import *
-from .listing import Listing
+from .listing import Listing, listing_counts
 from database.models import *
 
-import time
-
 
 __all__ = (
     "get_full_tournament",
@@ -16,24 +15,39 @@ __all__ = (
 )
 
 
+TOURNAMENT_FORMAT = DictionaryType({
+    "name": StringType(range(1, 129)),
+    "abbreviation": StringType(range(0, 17), optional=True),
+    "link": StringType(range(0, 257), optional=True),
+    "description": StringType(range(0, 1025), optional=True),
+    "staff": ListType(
+        DictionaryType({
+            "id": IntegerType(minimum=0),
+            "roles": FlagType(UserRoles)
+        }),
+        max_len=200,
+        unique=True,
+        unique_check=lambda a, b: a["id"] != b["id"]
+    ),
+    "mappools": ListType(
+        DictionaryType({
+            "id": IntegerType(minimum=0),
+            "name_override": StringType(range(1, 65), optional=True)
+        }),
+        max_len=20
+    )
+})
+
+
 class TournamentListing(Listing[Tournament]):
     MODEL = Tournament
-    SEARCH_FIELDS = ("name", "abbreviation", "description")
 
 
 async def get_full_tournament(user, id):
     try:
-        tournament = await Tournament.objects.annotate(
-            favorite_count=models.Count("favorites")
-        ).prefetch_related(
+        tournament = await Tournament.objects.prefetch_related(
             "involvements__user",
-            "mappool_connections",
-            models.Prefetch(
-                "mappool_connections__mappool",
-                queryset=Mappool.objects.annotate(
-                    favorite_count=models.Count("favorite_connections")
-                )
-            ),
+            "mappool_connections__mappool"
         ).select_related("submitted_by").aget(id=id)
     except Tournament.DoesNotExist:
         return
@@ -64,41 +78,20 @@ async def tournaments(req, id=None):
         return JsonResponse(tournament, safe=False) if tournament is not None else \
             error("invalid tournament id", 404)
 
-    tournament_list, total_pages = await TournamentListing(req).aget()
+    tournament_list, total_pages, next_cursor = await TournamentListing(req).aget()
 
     return JsonResponse({
         "data": list((
             tournament.serialize(includes=["favorite_count"]) for tournament in tournament_list
         )),
-        "total_pages": total_pages
+        "total_pages": total_pages,
+        "next_cursor": next_cursor,
+        "max_page": settings.LISTING_MAX_PAGE
     }, safe=False)
 
 
 @requires_auth
-@accepts_json_data(
-    DictionaryType({
-        "name": StringType(range(1, 129)),
-        "abbreviation": StringType(range(0, 17), optional=True),
-        "link": StringType(range(0, 257), optional=True),
-        "description": StringType(range(0, 1025), optional=True),
-        "staff": ListType(
-            DictionaryType({
-                "id": IntegerType(minimum=0),
-                "roles": FlagType(UserRoles)
-            }),
-            max_len=200,
-            unique=True,
-            unique_check=lambda a, b: a["id"] != b["id"]
-        ),
-        "mappools": ListType(
-            DictionaryType({
-                "id": IntegerType(minimum=0),
-                "name_override": StringType(range(1, 65), optional=True)
-            }),
-            max_len=20
-        )
-    })
-)
+@accepts_json_data(TOURNAMENT_FORMAT)
 async def create_tournament(req, data):
     invalid_mappool_ids = []
     mappools = [mappool async for mappool in Mappool.objects.filter(id__in=[m["id"] for m in data["mappools"]])]
@@ -120,6 +113,7 @@ async def create_tournament(req, data):
         data["mappools"],
         data.get("id") or 0
     )
+    await listing_counts.invalidate()
 
     return JsonResponse(tournament.serialize(), safe=False)
 
@@ -135,6 +129,7 @@ async def delete_tournament(req, id):
         return error("You cannot delete a tournament submitted by another user", 403)
 
     await tournament.adelete()
+    await listing_counts.invalidate()
 
     return HttpResponse(b"", status=200)
 
@@ -160,8 +155,8 @@ async def favorite_tournament(req, tournament_id, data):
         return HttpResponse(b"", 200)
 
     if data["favorite"]:
-        await TournamentFavorite.objects.acreate(tournament_id=tournament.id, user_id=user.id, timestamp=time.time()//1)
+        await tournament.add_favorite(user.id)
     else:
-        await favorite.adelete()
+        await tournament.remove_favorite(favorite)
 
     return HttpResponse(b"", 200)
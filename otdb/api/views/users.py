@@ -12,26 +12,10 @@ __all__ = (
 async def users(req, id):
     try:
         user = await OsuUser.objects.prefetch_related(
-            models.Prefetch(
-                "involvements__tournament",
-                queryset=Tournament.objects.annotate(
-                    favorite_count=models.Count("favorites")
-                )
-            ),
-            models.Prefetch(
-                "tournament_favorite_connections__tournament",
-                queryset=Tournament.objects.annotate(
-                    favorite_count=models.Count("favorites")
-                )
-            ),
-            models.Prefetch(
-                "mappool_favorite_connections__mappool",
-                queryset=Mappool.objects.annotate(
-                    favorite_count=models.Count("favorites")
-                )
-            )
+            "involvements__tournament",
+            "tournament_favorite_connections__tournament",
+            "mappool_favorite_connections__mappool"
         ).aget(id=id)
-        OsuUser.objects.values()
     except OsuUser.DoesNotExist:
         return error("Invalid user id", 400)
 
@@ -17,6 +17,16 @@ def requires_auth(func):
     return check
 
 
+def requires_admin(func):
+    async def check(req, *args, **kwargs):
+        user = await req.auser()
+        if not user.is_authenticated or not user.is_admin:
+            return error("Must be an admin to call this endpoint", 403)
+        return await func(req, *args, **kwargs)
+
+    return check
+
+
 def accepts_json_data(fmt):
     def decorator(func):
         async def check(req, *args, **kwargs):
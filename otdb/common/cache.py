@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+
+__all__ = (
+    "LRUCache",
+)
+
+
+class LRUCache:
+    """max_size is an entry count unless entries are given a size, e.g. in bytes"""
+
+    __slots__ = ("max_size", "size", "hits", "misses", "evictions", "_items")
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.size: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        self._items: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            self._items.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return self._items[key][0]
+
+    def set(self, key, value, size: int = 1):
+        self.pop(key)
+
+        # would just evict everything else and then itself
+        if size > self.max_size:
+            return
+
+        self._items[key] = (value, size)
+        self.size += size
+
+        while self.size > self.max_size:
+            self.size -= self._items.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        try:
+            value, size = self._items.pop(key)
+        except KeyError:
+            return default
+
+        self.size -= size
+        return value
+
+    def clear(self):
+        self._items.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._items),
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,42 @@
+from typing import Callable, Generic, TypeVar
+import asyncio
+
+
+__all__ = (
+    "LoopLocal",
+)
+
+
+_T = TypeVar("_T")
+
+
+class LoopLocal(Generic[_T]):
+    """A value made separately for each event loop.
+
+    asyncio objects (locks, semaphores, tasks, sessions) only work in the loop they were first
+    used in, but one process can run several loops one after another: asyncio.run in management
+    commands, or a new loop per test. Only the latest loop's value is kept."""
+
+    __slots__ = ("_factory", "_loop", "_value")
+
+    def __init__(self, factory: Callable[[], _T]):
+        self._factory = factory
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._value: _T | None = None
+
+    def get(self) -> _T:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._value = self._factory()
+            self._loop = loop
+
+        return self._value
+
+    def pop(self) -> _T | None:
+        """Forgets the running loop's value and returns it (if there is one), e.g. to close it"""
+        if self._loop is not asyncio.get_running_loop():
+            return
+
+        value = self._value
+        self._loop = self._value = None
+        return value
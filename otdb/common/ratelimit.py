@@ -0,0 +1,49 @@
+from .loop import LoopLocal
+
+import asyncio
+import time
+
+
+__all__ = (
+    "TokenBucket",
+)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "_tokens", "_updated_at", "_paused_until", "_lock")
+
+    def __init__(self, rate: float, capacity: int):
+        """rate is in tokens per second, capacity is the most that can be used in a burst"""
+        self.rate: float = rate
+        self.capacity: int = capacity
+
+        self._tokens: float = capacity
+        self._updated_at: float = time.monotonic()
+        self._paused_until: float = 0
+        # keeps waiters in order
+        self._lock = LoopLocal(asyncio.Lock)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for a while, e.g. after being told to back off"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated_at = self._paused_until
+
+    async def acquire(self):
+        async with self._lock.get():
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,61 @@
+from django.db import connection
+
+from psycopg import Cursor
+from psycopg.types.composite import CompositeInfo, register_composite
+from psycopg.types.json import Jsonb
+
+
+__all__ = (
+    "CompositeType",
+    "call_function",
+    "Jsonb",
+)
+
+
+def _load_row(values: list, info: CompositeInfo) -> tuple:
+    return tuple(values)
+
+
+def _dump_row(row: tuple, info: CompositeInfo) -> tuple:
+    return row
+
+
+class CompositeType:
+    """A composite type (like a table's row type) that values are passed to sql functions as.
+
+    Its oids are looked up the first time it's used. The adapters psycopg makes for it are
+    cached, as long as the same row class and functions are passed, so registering them on
+    each cursor that needs them is cheap."""
+
+    __slots__ = ("name", "row", "_info")
+
+    def __init__(self, name: str):
+        self.name: str = name
+        # plain tuples are adapted as anonymous records, values of this type need their own class
+        self.row: type = type(name, (tuple,), {"__slots__": ()})
+        self._info: CompositeInfo | None = None
+
+    def register(self, cursor: Cursor):
+        if self._info is None:
+            info = CompositeInfo.fetch(cursor.connection, self.name)
+            if info is None:
+                raise LookupError(f"No composite type named {self.name}")
+            self._info = info
+
+        register_composite(self._info, cursor, self.row, make_object=_load_row, make_sequence=_dump_row)
+
+
+def call_function(query: str, params: tuple, types: tuple[CompositeType, ...] = ()):
+    """Runs a query that calls a function and returns the value it returns.
+
+    Parameters are bound by the server, so scalars need casts in the query (e.g. %s::integer)
+    and every array is a single parameter; the query is the same no matter how many items
+    there are. It's prepared by psycopg according to the connection's prepare_threshold
+    (see DB_PREPARE_THRESHOLD in settings), which is off by default since poolers in
+    transaction mode can't keep prepared statements."""
+    connection.ensure_connection()
+    with connection.make_cursor(Cursor(connection.connection)) as cursor:
+        for composite in types:
+            composite.register(cursor.cursor)
+        cursor.execute(query, params)
+        return cursor.fetchone()[0]
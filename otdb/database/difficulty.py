@@ -0,0 +1,78 @@
+# Runs inside BeatmapCacheManager's worker pool. Process pool workers import
+# this module fresh, so it can't depend on django being set up.
+
+import rosu_pp_py as rosu
+import threading
+import hashlib
+import zlib
+import os
+
+from common.cache import LRUCache
+
+
+__all__ = (
+    "CorruptBeatmapError",
+    "configure",
+    "calculate",
+)
+
+
+class CorruptBeatmapError(Exception):
+    pass
+
+
+# rough memory used by a parsed beatmap relative to the size of its uncompressed .osu file
+PARSED_SIZE_FACTOR = 3
+
+# checksum -> parsed beatmap, local to each worker process
+parsed_beatmaps = LRUCache(0)
+# only needed when running on a thread pool
+_lock = threading.Lock()
+
+
+def configure(max_parsed_bytes: int):
+    parsed_beatmaps.max_size = max_parsed_bytes
+
+
+def _get_beatmap(path: str, checksum: str) -> rosu.Beatmap:
+    with _lock:
+        beatmap = parsed_beatmaps.get(checksum)
+
+    if beatmap is None:
+        with open(path, "rb") as f:
+            try:
+                data = zlib.decompress(f.read())
+            except zlib.error:
+                raise CorruptBeatmapError(checksum)
+
+        if hashlib.md5(data).hexdigest() != checksum:
+            raise CorruptBeatmapError(checksum)
+
+        beatmap = rosu.Beatmap(bytes=data)
+
+        with _lock:
+            parsed_beatmaps.set(checksum, beatmap, len(data) * PARSED_SIZE_FACTOR)
+
+    return beatmap
+
+
+def calculate(path: str, checksum: str, mods: int) -> tuple[dict, int, dict]:
+    """Returns the difficulty values along with this worker's pid and parsed beatmap cache stats"""
+    beatmap = _get_beatmap(path, checksum)
+    difficulty = rosu.Difficulty(mods=mods).calculate(beatmap)
+    attributes = rosu.BeatmapAttributesBuilder(map=beatmap, mods=mods).build()
+
+    values = {
+        "star_rating": difficulty.stars,
+        "max_combo": difficulty.max_combo,
+        "ar": attributes.ar,
+        "od": attributes.od,
+        "cs": attributes.cs,
+        "hp": attributes.hp,
+        "bpm": beatmap.bpm * attributes.clock_rate
+    }
+
+    with _lock:
+        stats = parsed_beatmaps.stats()
+
+    return values, os.getpid(), stats
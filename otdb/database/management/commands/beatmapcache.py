@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from database.models import beatmap_cache
+
+from datetime import datetime
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+    return f"{size:.1f} GiB"
+
+
+class Command(BaseCommand):
+    help = "Reports the size of the .osu beatmap cache and optionally prunes it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete the least recently used files until the cache fits in the max size"
+        )
+        parser.add_argument(
+            "--max-size",
+            type=int,
+            default=settings.BEATMAP_CACHE_MAX_SIZE,
+            help="Max size in bytes to prune to (defaults to BEATMAP_CACHE_MAX_SIZE)"
+        )
+
+    def handle(self, *args, **options):
+        migrated = beatmap_cache.migrate_legacy_files()
+        if migrated > 0:
+            self.stdout.write(f"Compressed {migrated} uncompressed file(s)")
+
+        removed = beatmap_cache.remove_stale_tmp_files()
+        if removed > 0:
+            self.stdout.write(f"Removed {removed} leftover temp file(s)")
+
+        files = list(beatmap_cache.iter_files())
+        size = sum(stat.st_size for _, stat in files)
+
+        self.stdout.write(f"Files: {len(files)}")
+        self.stdout.write(f"Size: {format_size(size)} / {format_size(options['max_size'])}")
+        if len(files) > 0:
+            oldest = min(stat.st_atime for _, stat in files)
+            self.stdout.write(f"Least recently used: {datetime.fromtimestamp(oldest).isoformat(' ', 'seconds')}")
+
+        if options["prune"]:
+            deleted, size = beatmap_cache.prune(options["max_size"])
+            self.stdout.write(f"Deleted {deleted} file(s), size is now {format_size(size)}")
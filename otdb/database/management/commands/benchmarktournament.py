@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from database.models import Tournament
+
+import statistics
+import time
+
+
+# far above any real osu user id so existing users are never touched
+FIRST_USER_ID = 1_000_000_000
+
+
+class Command(BaseCommand):
+    help = "Times new_tournament for different staff list sizes (nothing is saved)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--staff",
+            type=int,
+            nargs="+",
+            default=[10, 100, 200],
+            help="Staff list sizes to benchmark"
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Runs per staff list size"
+        )
+
+    @staticmethod
+    def _can_count_statements(cursor) -> bool:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+        if cursor.fetchone() is None:
+            return False
+
+        # statements run inside functions are only tracked with "all"
+        cursor.execute("SELECT current_setting('pg_stat_statements.track', true)")
+        return cursor.fetchone()[0] == "all"
+
+    @staticmethod
+    def _count_statements(cursor) -> int:
+        cursor.execute(
+            "SELECT coalesce(sum(calls), 0) FROM pg_stat_statements "
+            "WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database()) "
+            "AND query NOT LIKE '%pg_stat_statements%'"
+        )
+        return cursor.fetchone()[0]
+
+    def _run(self, n_staff: int, count_statements: bool) -> tuple[float, int | None]:
+        users = [
+            (FIRST_USER_ID + i, f"benchmark{i}", "https://a.ppy.sh/", "https://assets.ppy.sh/")
+            for i in range(n_staff)
+        ]
+        roles = [1 << (i % 13) for i in range(n_staff)]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            statements = self._count_statements(cursor) if count_statements else None
+
+            start = time.perf_counter()
+            Tournament._new_tournament(
+                Tournament,
+                f"benchmark {n_staff}",
+                "BM",
+                "",
+                "",
+                None,
+                users,
+                roles,
+                []
+            )
+            elapsed = time.perf_counter() - start
+
+            if count_statements:
+                # minus the call to new_tournament itself
+                statements = self._count_statements(cursor) - statements - 1
+
+            transaction.set_rollback(True)
+
+        return elapsed, statements
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            count_statements = self._can_count_statements(cursor)
+
+        if not count_statements:
+            self.stderr.write(
+                "Statements aren't counted: needs the pg_stat_statements extension "
+                "with pg_stat_statements.track = all"
+            )
+
+        for n_staff in options["staff"]:
+            results = [self._run(n_staff, count_statements) for _ in range(options["repeat"])]
+            times = [elapsed * 1000 for elapsed, _ in results]
+
+            line = f"{n_staff} staff: median {statistics.median(times):.2f} ms, min {min(times):.2f} ms"
+            if count_statements:
+                line += f", {max(statements for _, statements in results)} statements"
+            self.stdout.write(line)
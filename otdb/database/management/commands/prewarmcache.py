@@ -0,0 +1,160 @@
+from django.core.management.base import BaseCommand
+
+from database.models import (
+    MappoolBeatmap,
+    BeatmapDifficultyAttributes,
+    ROSU_VERSION,
+    COMMON_MODS,
+    ResolvedBeatmap,
+    beatmap_cache,
+    beatmap_resolver
+)
+
+from collections import defaultdict
+import itertools
+import asyncio
+import os
+
+
+# beatmaps checked at a time
+BATCH_SIZE = 50
+STATE_FILE = os.path.join(beatmap_cache.CACHE_DIR, ".prewarm")
+
+
+class Command(BaseCommand):
+    help = "Downloads and calculates difficulty for mappool beatmaps (and common mod combinations) that aren't cached yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue after the last beatmap a previous run finished"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Beatmaps processed at the same time (downloads are still rate limited)"
+        )
+
+    @staticmethod
+    def _read_state() -> int:
+        try:
+            with open(STATE_FILE) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _write_state(beatmap_id: int):
+        with open(STATE_FILE, "w") as f:
+            f.write(str(beatmap_id))
+
+    @staticmethod
+    async def _get_beatmaps(start_id: int) -> tuple[dict[int, ResolvedBeatmap], dict[int, set[int]]]:
+        """beatmap id -> the beatmap as stored, and beatmap id -> mod combinations it's used with plus the common ones"""
+        beatmaps = {}
+        mods = defaultdict(lambda: set(COMMON_MODS))
+        queryset = MappoolBeatmap.objects.filter(
+            beatmap_metadata_id__gt=start_id
+        ).select_related(
+            "beatmap_metadata",
+            "beatmapset_metadata"
+        ).prefetch_related("mods").order_by("beatmap_metadata_id")
+
+        async for mappool_beatmap in queryset:
+            beatmaps[mappool_beatmap.beatmap_metadata_id] = ResolvedBeatmap.from_db(mappool_beatmap)
+            mods[mappool_beatmap.beatmap_metadata_id].add(
+                MappoolBeatmap.get_mods_flag(mod.acronym for mod in mappool_beatmap.mods.all())
+            )
+
+        return beatmaps, mods
+
+    async def _resolve(self, beatmaps: list[ResolvedBeatmap]) -> list[ResolvedBeatmap]:
+        """Stored metadata is reused; only beatmaps stored without a checksum are looked up again"""
+        unknown = [beatmap.id for beatmap in beatmaps if not beatmap.checksum]
+        if len(unknown) == 0:
+            return beatmaps
+
+        resolved = await beatmap_resolver.get_beatmaps(unknown)
+        missing = [beatmap_id for beatmap_id, beatmap in resolved.items() if beatmap is None]
+        if len(missing) > 0:
+            self.stderr.write(f"Skipping beatmaps that no longer exist: {', '.join(map(str, missing))}")
+
+        return [
+            beatmap if beatmap.checksum else resolved[beatmap.id]
+            for beatmap in beatmaps
+            if beatmap.checksum or resolved[beatmap.id] is not None
+        ]
+
+    async def _prewarm_batch(
+        self,
+        semaphore: asyncio.Semaphore,
+        beatmaps: list[ResolvedBeatmap],
+        mods: dict[int, set[int]]
+    ) -> tuple[int, int]:
+        """Returns the number of beatmaps that were already done and the number that failed"""
+        beatmaps = await self._resolve(beatmaps)
+
+        cached = set()
+        async for key in BeatmapDifficultyAttributes.objects.filter(
+            checksum__in=[beatmap.checksum for beatmap in beatmaps],
+            rosu_version=ROSU_VERSION
+        ).values_list("checksum", "mods"):
+            cached.add(key)
+
+        # the .osu file is only needed (and downloaded) for attributes that haven't been calculated
+        todo = [
+            (beatmap, [mods_flag for mods_flag in mods[beatmap.id] if (beatmap.checksum, mods_flag) not in cached])
+            for beatmap in beatmaps
+        ]
+        todo = [(beatmap, missing) for beatmap, missing in todo if len(missing) > 0]
+
+        async def prewarm(beatmap, missing):
+            async with semaphore:
+                for mods_flag in missing:
+                    await beatmap_cache.get_beatmap_attributes(beatmap, mods_flag)
+
+        failed = 0
+        results = await asyncio.gather(*itertools.starmap(prewarm, todo), return_exceptions=True)
+        for (beatmap, _), result in zip(todo, results):
+            if isinstance(result, Exception):
+                self.stderr.write(f"Failed to prewarm beatmap {beatmap.id}: {result}")
+                failed += 1
+
+        return len(beatmaps) - len(todo), failed
+
+    async def _prewarm(self, start_id: int, concurrency: int):
+        beatmaps, mods = await self._get_beatmaps(start_id)
+        if len(beatmaps) == 0:
+            self.stdout.write("Nothing to prewarm")
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+        done = 0
+        skipped = 0
+        failed = 0
+        try:
+            for batch in itertools.batched(beatmaps.values(), BATCH_SIZE):
+                batch_skipped, batch_failed = await self._prewarm_batch(semaphore, list(batch), mods)
+
+                # once something fails, resuming has to start from there
+                if failed == 0 and batch_failed == 0:
+                    self._write_state(batch[-1].id)
+
+                done += len(batch)
+                skipped += batch_skipped
+                failed += batch_failed
+                self.stdout.write(
+                    f"[{done}/{len(beatmaps)}] prewarmed up to beatmap {batch[-1].id} "
+                    f"({skipped} already done, {failed} failed)"
+                )
+        finally:
+            await beatmap_cache.close()
+
+    def handle(self, *args, **options):
+        start_id = self._read_state() if options["resume"] else 0
+        if start_id > 0:
+            self.stdout.write(f"Resuming after beatmap {start_id}")
+
+        asyncio.run(self._prewarm(start_id, options["concurrency"]))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from database.models import Mappool, MappoolFavorite, Tournament, TournamentFavorite, reconcile_favorite_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Corrects the stored favorite counts of mappools and tournaments, for favorites "
+        "that were added or removed without going through the api (like with deleted users)"
+    )
+
+    def handle(self, *args, **options):
+        mappools = reconcile_favorite_counts(Mappool, MappoolFavorite, "mappool")
+        tournaments = reconcile_favorite_counts(Tournament, TournamentFavorite, "tournament")
+        self.stdout.write(f"Corrected {mappools} mappool(s) and {tournaments} tournament(s)")
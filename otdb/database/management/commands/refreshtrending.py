@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from database.models import Mappool, MappoolFavorite, Tournament, TournamentFavorite, refresh_trending_scores
+
+
+class Command(BaseCommand):
+    help = "Recomputes the trending scores of mappools and tournaments from their favorites (meant to be run periodically)"
+
+    def handle(self, *args, **options):
+        mappools = refresh_trending_scores(Mappool, MappoolFavorite, "mappool")
+        tournaments = refresh_trending_scores(Tournament, TournamentFavorite, "tournament")
+        self.stdout.write(f"Refreshed {mappools} mappool(s) and {tournaments} tournament(s)")
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0013_alter_mappool_description_alter_mappool_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BeatmapDifficultyAttributes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('beatmap_id', models.PositiveIntegerField()),
+                ('checksum', models.CharField(max_length=32)),
+                ('mods', models.PositiveIntegerField()),
+                ('rosu_version', models.CharField(max_length=16)),
+                ('star_rating', models.FloatField()),
+                ('max_combo', models.PositiveIntegerField()),
+                ('ar', models.FloatField()),
+                ('od', models.FloatField()),
+                ('cs', models.FloatField()),
+                ('hp', models.FloatField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('checksum', 'mods', 'rosu_version'), name='beatmapdifficultyattributes_unique_constraint')],
+            },
+        ),
+    ]
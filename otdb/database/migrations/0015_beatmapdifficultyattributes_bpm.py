@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 11:02
+
+from django.db import migrations, models
+
+
+def clear_difficulty_cache(apps, schema_editor):
+    # rows from before bpm was stored are just recalculated when needed
+    apps.get_model("database", "BeatmapDifficultyAttributes").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0014_beatmapdifficultyattributes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_difficulty_cache, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='beatmapdifficultyattributes',
+            name='bpm',
+            field=models.FloatField(default=0),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0015_beatmapdifficultyattributes_bpm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beatmapmetadata',
+            name='checksum',
+            field=models.CharField(default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='beatmapmetadata',
+            name='fetched_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
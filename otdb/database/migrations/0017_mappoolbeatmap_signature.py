@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0016_beatmapmetadata_checksum_fetched_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mappoolbeatmap',
+            name='signature',
+            field=models.CharField(default=''),
+        ),
+    ]
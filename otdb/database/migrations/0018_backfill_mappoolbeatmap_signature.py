@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-17 10:21
+
+from django.db import migrations
+import json
+
+
+def backfill_signatures(apps, schema_editor):
+    MappoolBeatmap = apps.get_model("database", "MappoolBeatmap")
+    MappoolBeatmapConnection = apps.get_model("database", "MappoolBeatmapConnection")
+
+    # (beatmap id, signature) -> id of the mappool beatmap that's kept
+    kept = {}
+    for mappool_beatmap in MappoolBeatmap.objects.prefetch_related("mods").order_by("id"):
+        # same as MappoolBeatmap.get_mods_signature
+        signature = ",".join(sorted(set(
+            mod.acronym + (json.dumps(mod.settings, sort_keys=True, separators=(",", ":")) if mod.settings else "")
+            for mod in mappool_beatmap.mods.all()
+        )))
+
+        key = (mappool_beatmap.beatmap_metadata_id, signature)
+        if key in kept:
+            # duplicates could be made when the same beatmap was submitted in
+            # two mappools at the same time
+            MappoolBeatmapConnection.objects.filter(beatmap_id=mappool_beatmap.id).update(beatmap_id=kept[key])
+            mappool_beatmap.delete()
+            continue
+
+        kept[key] = mappool_beatmap.id
+        mappool_beatmap.signature = signature
+        mappool_beatmap.save(update_fields=["signature"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0017_mappoolbeatmap_signature'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_signatures, migrations.RunPython.noop),
+    ]
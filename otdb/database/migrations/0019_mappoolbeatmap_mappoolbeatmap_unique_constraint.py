@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0018_backfill_mappoolbeatmap_signature'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='mappoolbeatmap',
+            constraint=models.UniqueConstraint(fields=('beatmap_metadata', 'signature'), name='mappoolbeatmap_unique_constraint'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-17 10:37
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+BACKFILL_SQL = """
+UPDATE database_tournament SET search_vector =
+    setweight(to_tsvector('english', name), 'A') ||
+    setweight(to_tsvector('english', abbreviation), 'A') ||
+    setweight(to_tsvector('english', description), 'C');
+
+UPDATE database_mappool m SET search_vector = (
+    SELECT
+        setweight(to_tsvector('english', m.name), 'A') ||
+        setweight(to_tsvector('english', coalesce(string_agg(conn.name_override, ' '), '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(string_agg(t.name || ' ' || t.abbreviation, ' '), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(string_agg(t.description, ' '), '')), 'D')
+    FROM database_mappoolconnection conn
+    INNER JOIN database_tournament t ON t.id = conn.tournament_id
+    WHERE conn.mappool_id = m.id
+);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0019_mappoolbeatmap_mappoolbeatmap_unique_constraint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mappool',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        # triggers in sql/search_vectors.sql keep these current after this
+        migrations.RunSQL(
+            BACKFILL_SQL,
+            migrations.RunSQL.noop
+        ),
+        migrations.AddIndex(
+            model_name='mappool',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='mappool_search_vector_index'),
+        ),
+        migrations.AddIndex(
+            model_name='tournament',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='tournament_search_vector_index'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-17 10:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Cast, Coalesce, Exp
+
+import math
+
+
+def backfill_trending_scores(apps, schema_editor):
+    rate = math.log(2) / settings.TRENDING_HALF_LIFE
+    weight = Exp(Cast(models.F("timestamp") - settings.TRENDING_EPOCH, models.FloatField()) * models.Value(rate))
+
+    for model_name, favorite_model_name, field in (
+        ("Mappool", "MappoolFavorite", "mappool"),
+        ("Tournament", "TournamentFavorite", "tournament")
+    ):
+        favorites = apps.get_model("database", favorite_model_name).objects.filter(
+            **{field: models.OuterRef("id")}
+        ).order_by().values(field).annotate(score=models.Sum(weight)).values("score")
+        apps.get_model("database", model_name).objects.update(trending_score=Coalesce(
+            models.Subquery(favorites, output_field=models.FloatField()),
+            models.Value(0.0)
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0020_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mappool',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_trending_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='mappool',
+            index=models.Index(fields=['trending_score', 'id'], name='mappool_trending_index'),
+        ),
+        migrations.AddIndex(
+            model_name='tournament',
+            index=models.Index(fields=['trending_score', 'id'], name='tournament_trending_index'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-17 10:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_favorite_counts(apps, schema_editor):
+    for model_name, favorite_model_name, field in (
+        ("Mappool", "MappoolFavorite", "mappool"),
+        ("Tournament", "TournamentFavorite", "tournament")
+    ):
+        favorites = apps.get_model("database", favorite_model_name).objects.filter(
+            **{field: models.OuterRef("id")}
+        ).order_by().values(field).annotate(count=models.Count("id")).values("count")
+        apps.get_model("database", model_name).objects.update(favorite_count=Coalesce(
+            models.Subquery(favorites, output_field=models.IntegerField()),
+            models.Value(0)
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0021_trending_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mappool',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_favorite_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='mappool',
+            index=models.Index(fields=['favorite_count', 'id'], name='mappool_favorites_index'),
+        ),
+        migrations.AddIndex(
+            model_name='tournament',
+            index=models.Index(fields=['favorite_count', 'id'], name='tournament_favorites_index'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-17 14:20
+
+from django.conf import settings
+from django.db import migrations
+
+import math
+
+
+def recompute_trending_scores(apps, schema_editor):
+    # replaces the scores 0021 backfilled, which were sums of weights that could overflow
+    # same as sql/trending.sql, which isn't created until after migrations have run
+    rate = math.log(2) / settings.TRENDING_HALF_LIFE
+    for table, favorite_table, column in (
+        ("database_mappool", "database_mappoolfavorite", "mappool_id"),
+        ("database_tournament", "database_tournamentfavorite", "tournament_id")
+    ):
+        schema_editor.execute(f"""
+            UPDATE {table} SET trending_score = coalesce((
+                SELECT max_weight + ln(
+                    exp(greatest(-max_weight, -700)) +
+                    sum(exp(greatest(weight - max_weight, -700)))
+                )
+                FROM (
+                    SELECT f.timestamp * %s AS weight, max(f.timestamp * %s) OVER () AS max_weight
+                    FROM {favorite_table} f
+                    WHERE f.{column} = {table}.id
+                ) weights
+                GROUP BY max_weight
+            ), 0)
+        """, (rate, rate))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0022_favorite_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_trending_scores, migrations.RunPython.noop),
+    ]
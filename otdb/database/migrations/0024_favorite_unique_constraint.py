@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-17 11:33
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    # the earliest favorite of each user stays; trending scores are corrected by refreshtrending
+    for model_name, favorite_model_name, field in (
+        ("Mappool", "MappoolFavorite", "mappool"),
+        ("Tournament", "TournamentFavorite", "tournament")
+    ):
+        favorite_model = apps.get_model("database", favorite_model_name)
+        earlier = favorite_model.objects.filter(
+            **{field: models.OuterRef(field), "user": models.OuterRef("user"), "id__lt": models.OuterRef("id")}
+        )
+        deleted, _ = favorite_model.objects.filter(models.Exists(earlier)).delete()
+        if deleted == 0:
+            continue
+
+        favorites = favorite_model.objects.filter(
+            **{field: models.OuterRef("id")}
+        ).order_by().values(field).annotate(count=models.Count("id")).values("count")
+        apps.get_model("database", model_name).objects.update(favorite_count=Coalesce(
+            models.Subquery(favorites, output_field=models.IntegerField()),
+            models.Value(0)
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0023_trending_log_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='mappoolfavorite',
+            constraint=models.UniqueConstraint(fields=('mappool', 'user'), name='mappoolfavorite_unique_constraint'),
+        ),
+        migrations.AddConstraint(
+            model_name='tournamentfavorite',
+            constraint=models.UniqueConstraint(fields=('tournament', 'user'), name='tournamentfavorite_unique_constraint'),
+        ),
+    ]
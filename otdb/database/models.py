@@ -1,27 +1,120 @@
-from django.db import models, connection
+from django.db import models, transaction
+from django.db.models.functions import Abs, Coalesce, Exp, Greatest, Ln
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.postgres.indexes import GinIndex
 from django.conf import settings
+from django.utils import timezone
 
 from common.models import enum_field, SerializableModel
 from common.exceptions import ClientException, ServerException
-from common.util import unzip, find_invalids
+from common.util import unzip
+from common.cache import LRUCache
+from common.ratelimit import TokenBucket
+from common.loop import LoopLocal
+from common.sql import CompositeType, call_function, Jsonb
+
+from . import difficulty as difficulty_calc
 
 from osu import AsynchronousClient, Beatmap, Mods, Mod, GameModeStr
 from enum import IntFlag
-from aiohttp import ClientSession
+from typing import Iterable
+from datetime import datetime, timedelta
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from aiohttp import ClientSession, ClientTimeout, ClientConnectionError, TCPConnector
+from email.utils import parsedate_to_datetime
 from asgiref.sync import sync_to_async
-import aiofiles
-import rosu_pp_py as rosu
 import logging
 import asyncio
+import functools
 import os
+import time
+import zlib
+import json
+import hashlib
+import random
+import math
+import tempfile
+import contextlib
 import itertools
+import importlib.metadata
+import multiprocessing
+
+try:
+    import fcntl
+except ImportError:
+    # windows; only atomic writes keep multiple processes safe there
+    fcntl = None
 
 
 OsuUser = get_user_model()
 osu_client: AsynchronousClient = settings.OSU_CLIENT
 log = logging.getLogger(__name__)
 
+# cached difficulty attributes are only valid for the calculator version that produced them
+ROSU_VERSION = importlib.metadata.version("rosu-pp-py")
+# difficulty is precomputed for these as soon as a beatmap is downloaded
+COMMON_MODS = (
+    0,
+    Mods.Hidden.value,
+    Mods.HardRock.value,
+    Mods.DoubleTime.value,
+    Mods.Easy.value,
+    Mods.HalfTime.value,
+    Mods.Hidden.value | Mods.HardRock.value,
+    Mods.Hidden.value | Mods.DoubleTime.value,
+    Mods.Flashlight.value
+)
+
+
+class _CacheLoopState:
+    """The parts of BeatmapCacheManager that belong to the event loop they're used in"""
+
+    __slots__ = (
+        "download_semaphore", "downloads", "calc_semaphore", "precompute_semaphore", "calculations",
+        "background_tasks", "prune_task", "session"
+    )
+
+    def __init__(self) -> None:
+        # osu doesn't like concurrent requests to the download endpoint; on top
+        # of this, downloads are rate limited by a token bucket
+        self.download_semaphore = asyncio.Semaphore(settings.BEATMAP_DOWNLOAD_CONCURRENCY)
+        # checksum -> in-flight download shared by all requests for that beatmap
+        self.downloads: dict[str, asyncio.Task] = {}
+        # bounds how much calculation work can queue up for the workers
+        self.calc_semaphore = asyncio.Semaphore(settings.BEATMAP_CALC_WORKERS + settings.BEATMAP_CALC_QUEUE_SIZE)
+        # precomputation only ever takes this many calculation slots away from requests
+        self.precompute_semaphore = asyncio.Semaphore(settings.BEATMAP_PRECOMPUTE_CONCURRENCY)
+        # (checksum, mods) -> in-flight lookup shared by everything that wants those attributes
+        self.calculations: dict[tuple[str, int], asyncio.Task] = {}
+        # referenced so they aren't garbage collected before finishing
+        self.background_tasks: set[asyncio.Task] = set()
+        self.prune_task: asyncio.Task | None = None
+        # one pooled session for all downloads, created on first use
+        self.session: ClientSession | None = None
+
+    def get_session(self) -> ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = ClientSession(
+                connector=TCPConnector(limit=settings.BEATMAP_DOWNLOAD_CONCURRENCY),
+                timeout=ClientTimeout(total=30)
+            )
+
+        return self.session
+
+    async def close(self):
+        tasks = [*self.background_tasks, *self.downloads.values(), *self.calculations.values()]
+        if self.prune_task is not None:
+            tasks.append(self.prune_task)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self.session is not None:
+            await self.session.close()
+
 
 class BeatmapCacheManager:
     CACHE_DIR = os.path.join(settings.BASE_DIR, "cache")
@@ -30,49 +123,651 @@ class BeatmapCacheManager:
         if not os.path.isdir(self.CACHE_DIR):
             os.mkdir(self.CACHE_DIR)
 
-        self._lock = asyncio.Lock()
+        self._loop_state = LoopLocal(_CacheLoopState)
+        # (checksum, mods) -> BeatmapDifficultyAttributes, in front of the database table
+        self._difficulties = LRUCache(settings.BEATMAP_DIFFICULTY_CACHE_SIZE)
+
+        # parsing and calculation is cpu heavy, so it's kept off the event loop
+        self._executor: Executor | None = None
+        # each worker keeps its own cache of parsed beatmaps; pid -> latest stats of it
+        self._parsed_beatmap_stats: dict[int, dict] = {}
+
+        self._rate_limiter = TokenBucket(settings.BEATMAP_DOWNLOAD_RATE, settings.BEATMAP_DOWNLOAD_BURST)
+
+        # estimate of the cache directory's size, None until it's first scanned
+        self._cache_size: int | None = None
+
+    def _get_shard_dir(self, checksum: str) -> str:
+        # sharded two levels deep to keep directories small
+        return os.path.join(self.CACHE_DIR, checksum[:2], checksum[2:4])
+
+    def get_path(self, checksum: str) -> str:
+        return os.path.join(self._get_shard_dir(checksum), f"{checksum}.osu.zlib")
+
+    def _get_legacy_paths(self, checksum: str) -> tuple[str, str]:
+        """Uncompressed files from before and after the cache was sharded"""
+        return (
+            os.path.join(self._get_shard_dir(checksum), f"{checksum}.osu"),
+            os.path.join(self.CACHE_DIR, f"{checksum}.osu")
+        )
+
+    def iter_files(self):
+        """Yields (path, os.stat_result) of every cached .osu file"""
+        for root, _, files in os.walk(self.CACHE_DIR):
+            for file in files:
+                if not file.endswith(".osu.zlib") and not file.endswith(".osu"):
+                    continue
+
+                path = os.path.join(root, file)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    # removed by another worker
+                    continue
+
+    def get_size(self) -> int:
+        return sum(stat.st_size for _, stat in self.iter_files())
 
     @staticmethod
-    async def _download(id: int, path: str):
-        async with ClientSession() as session:
-            async with session.get(f"https://osu.ppy.sh/osu/{id}") as resp:
-                # shouldn't happen, but just in case
-                if resp.status == 404:
-                    raise ClientException(f"Invalid beatmap id: {id}")
+    def _write(path: str, data: bytes):
+        """Compresses and writes data so that other processes never see a partial file"""
+        data = zlib.compress(data)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        return len(data)
+
+    def _compress_file(self, legacy_path: str, path: str):
+        with open(legacy_path, "rb") as f:
+            self._write(path, f.read())
+
+        os.remove(legacy_path)
+
+    def migrate_legacy_files(self) -> int:
+        """Compresses uncompressed files and moves them into their shard directories"""
+        migrated = 0
+        for path, _ in list(self.iter_files()):
+            if path.endswith(".osu"):
+                self._compress_file(path, self.get_path(os.path.basename(path).removesuffix(".osu")))
+                migrated += 1
+
+        return migrated
+
+    def remove_stale_tmp_files(self, max_age: int = 3600) -> int:
+        """Removes temp files left behind by workers that died mid-write"""
+        removed = 0
+        for root, _, files in os.walk(self.CACHE_DIR):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    if file.endswith(".tmp") and os.stat(path).st_mtime < time.time() - max_age:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+
+        return removed
+
+    def prune(self, max_size: int) -> tuple[int, int]:
+        """Deletes the least recently accessed files until the cache fits in max_size.
+        Returns the number of files deleted and the size of the cache afterward."""
+        files = sorted(self.iter_files(), key=lambda file: file[1].st_atime)
+        size = sum(stat.st_size for _, stat in files)
+
+        deleted = 0
+        for path, stat in files:
+            if size <= max_size:
+                break
 
-                if resp.status == 429:
-                    raise ServerException(f"I've been rate limited by the osu site :( try again later")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
-                if 500 <= resp.status <= 599:
-                    raise ServerException(f"Unexpected error from osu server")
+            size -= stat.st_size
+            deleted += 1
 
-                resp.raise_for_status()
+        return deleted, size
 
-                async with aiofiles.open(path, mode="wb") as f:
-                    await f.write(await resp.read())
+    @staticmethod
+    def _touch(path: str):
+        # atime isn't reliably updated by reads (noatime, relatime), so it's done explicitly
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except FileNotFoundError:
+            pass
+
+    async def _prune(self):
+        # prune a bit further than the limit so this doesn't run on every download
+        target = int(settings.BEATMAP_CACHE_MAX_SIZE * 0.9)
+        deleted, self._cache_size = await asyncio.to_thread(self.prune, target)
+        log.info(f"Pruned {deleted} beatmap(s) from the cache")
+
+    async def _track_size(self, added: int):
+        if self._cache_size is None:
+            self._cache_size = await asyncio.to_thread(self.get_size)
+        else:
+            self._cache_size += added
+
+        state = self._loop_state.get()
+        if self._cache_size > settings.BEATMAP_CACHE_MAX_SIZE and state.prune_task is None:
+            state.prune_task = asyncio.create_task(self._prune())
+            state.prune_task.add_done_callback(functools.partial(self._on_prune_done, state))
 
-    async def get_beatmap_attributes(self, beatmap: Beatmap, mods: int) -> rosu.DifficultyAttributes:
-        # osu doesn't like concurrent requests to this endpoint
-        await self._lock.acquire()
+    @staticmethod
+    def _on_prune_done(state: _CacheLoopState, task: asyncio.Task):
+        state.prune_task = None
+        if task.cancelled():
+            return
+
+        try:
+            task.result()
+        except Exception as exc:
+            log.exception(exc)
+
+    @contextlib.asynccontextmanager
+    async def _file_lock(self, checksum: str):
+        """Lock shared between processes, so only one of them downloads a beatmap"""
+        if fcntl is None:
+            yield
+            return
+
+        shard_dir = self._get_shard_dir(checksum)
+        os.makedirs(shard_dir, exist_ok=True)
+
+        # one lock per shard directory; lock files are never deleted since
+        # that would let two processes hold "the same" lock
+        fd = os.open(os.path.join(shard_dir, ".lock"), os.O_RDWR | os.O_CREAT)
+        try:
+            # polled rather than blocking a thread, so waiting can be cancelled
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(0.05)
+
+            yield
+        finally:
+            # closing releases the lock
+            os.close(fd)
+
+    async def close(self):
+        """Stops the running event loop's downloads and background work, and the calculation workers"""
+        state = self._loop_state.pop()
+        if state is not None:
+            await state.close()
+
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, cancel_futures=True)
 
-        osu_path = os.path.join(self.CACHE_DIR, f"{beatmap.checksum}.osu")
+    @staticmethod
+    def _get_retry_after(resp) -> float | None:
+        value = resp.headers.get("Retry-After")
+        if value is None:
+            return
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return
+
+    async def _request_beatmap(self, beatmap: "ResolvedBeatmap") -> bytes:
+        for attempt in range(settings.BEATMAP_DOWNLOAD_RETRIES + 1):
+            is_last_attempt = attempt == settings.BEATMAP_DOWNLOAD_RETRIES
+            # exponential backoff with full jitter
+            backoff = random.uniform(0, min(30, 2 ** attempt))
+
+            await self._rate_limiter.acquire()
+
+            try:
+                async with self._loop_state.get().get_session().get(f"https://osu.ppy.sh/osu/{beatmap.id}") as resp:
+                    # shouldn't happen, but just in case
+                    if resp.status == 404:
+                        raise ClientException(f"Invalid beatmap id: {beatmap.id}")
+
+                    if resp.status == 429:
+                        if is_last_attempt:
+                            raise ServerException(f"I've been rate limited by the osu site :( try again later")
+
+                        # everyone backs off, not just this download
+                        retry_after = self._get_retry_after(resp)
+                        self._rate_limiter.pause(backoff if retry_after is None else retry_after + backoff)
+                        log.warning(f"Rate limited while downloading {beatmap.id}")
+                        continue
+
+                    if 500 <= resp.status <= 599:
+                        if is_last_attempt:
+                            raise ServerException(f"Unexpected error from osu server")
+
+                        await asyncio.sleep(backoff)
+                        continue
+
+                    resp.raise_for_status()
+
+                    return await resp.read()
+            except (ClientConnectionError, asyncio.TimeoutError):
+                if is_last_attempt:
+                    raise ServerException(f"Could not connect to the osu server")
+
+                await asyncio.sleep(backoff)
+
+    async def _download(self, beatmap: "ResolvedBeatmap", path: str) -> int:
+        data = await self._request_beatmap(beatmap)
+
+        # the beatmap was probably updated after its info was fetched
+        if hashlib.md5(data).hexdigest() != beatmap.checksum:
+            await beatmap_resolver.invalidate(beatmap.id)
+            raise ServerException(f"Downloaded beatmap {beatmap.id} doesn't match its checksum, try again")
+
+        return await asyncio.to_thread(self._write, path, data)
+
+    async def _limited_download(self, beatmap: "ResolvedBeatmap", path: str):
+        async with self._loop_state.get().download_semaphore:
+            # may have been downloaded while waiting for a slot
+            if os.path.exists(path):
+                return
 
-        if not os.path.exists(osu_path):
             log.info("Downloading " + beatmap.checksum)
-            await self._download(beatmap.id, osu_path)
+            size = await self._download(beatmap, path)
+
+        await self._track_size(size)
+
+    async def _fetch(self, beatmap: "ResolvedBeatmap", path: str):
+        async with self._file_lock(beatmap.checksum):
+            # another process may have gotten to it first
+            if os.path.exists(path):
+                return
+
+            # cached before files were compressed
+            for legacy_path in self._get_legacy_paths(beatmap.checksum):
+                if os.path.exists(legacy_path):
+                    await asyncio.to_thread(self._compress_file, legacy_path, path)
+                    return
+
+            await self._limited_download(beatmap, path)
+
+        self._run_in_background(self._precompute(beatmap))
+
+    def _run_in_background(self, coro):
+        background_tasks = self._loop_state.get().background_tasks
+
+        def callback(task):
+            background_tasks.discard(task)
+
+            try:
+                task.result()
+            except Exception as exc:
+                log.exception(exc)
+
+        task = asyncio.create_task(coro)
+        task.add_done_callback(callback)
+        background_tasks.add(task)
+
+    async def _precompute(self, beatmap: "ResolvedBeatmap"):
+        semaphore = self._loop_state.get().precompute_semaphore
+        for mods in COMMON_MODS:
+            async with semaphore:
+                await self.get_beatmap_attributes(beatmap, mods)
+
+    @staticmethod
+    def _on_shared_task_done(tasks: dict, key, task: asyncio.Task):
+        tasks.pop(key, None)
+
+        # every waiter receives the exception; this just stops asyncio from
+        # complaining about it if all of them were cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def ensure_cached(self, beatmap: "ResolvedBeatmap", invalidate: bool = False) -> str:
+        osu_path = self.get_path(beatmap.checksum)
+
+        # checked before the file so requests in this process share one download
+        downloads = self._loop_state.get().downloads
+        task = downloads.get(beatmap.checksum)
+        if task is None:
+            if invalidate:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(osu_path)
+            elif os.path.exists(osu_path):
+                self._touch(osu_path)
+                return osu_path
+
+            task = asyncio.create_task(self._fetch(beatmap, osu_path))
+            task.add_done_callback(functools.partial(self._on_shared_task_done, downloads, beatmap.checksum))
+            downloads[beatmap.checksum] = task
+
+        # shielded so a cancelled request doesn't cancel the download for everyone else
+        await asyncio.shield(task)
+
+        return osu_path
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            initargs = (settings.BEATMAP_PARSED_CACHE_SIZE,)
+            if settings.BEATMAP_CALC_EXECUTOR == "process":
+                # spawn since forking a process with running threads isn't safe
+                self._executor = ProcessPoolExecutor(
+                    settings.BEATMAP_CALC_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=difficulty_calc.configure,
+                    initargs=initargs
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    settings.BEATMAP_CALC_WORKERS,
+                    thread_name_prefix="beatmap-calc",
+                    initializer=difficulty_calc.configure,
+                    initargs=initargs
+                )
+
+        return self._executor
+
+    async def _run_calculation(self, func, *args):
+        # waiting here is the backpressure once the workers and queue are full
+        async with self._loop_state.get().calc_semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+
+    def get_parsed_beatmap_stats(self) -> dict:
+        """Parsed beatmap cache stats summed over all workers"""
+        total = {"entries": 0, "size": 0, "max_size": 0, "hits": 0, "misses": 0, "evictions": 0}
+        for stats in self._parsed_beatmap_stats.values():
+            for key in total:
+                total[key] += stats[key]
+
+        return total
 
-        self._lock.release()
+    async def get_beatmap_attributes(self, beatmap: "ResolvedBeatmap", mods: int) -> "BeatmapDifficultyAttributes":
+        key = (beatmap.checksum, mods)
+        if (difficulty := self._difficulties.get(key)) is not None:
+            return difficulty
 
-        async with aiofiles.open(osu_path, mode="rb") as f:
-            rosu_beatmap = rosu.Beatmap(bytes=await f.read())
-        difficulty = rosu.Difficulty(mods=mods).calculate(rosu_beatmap)
+        # requests and precomputation wanting the same attributes share one lookup and calculation
+        calculations = self._loop_state.get().calculations
+        task = calculations.get(key)
+        if task is None:
+            task = asyncio.create_task(self._get_beatmap_attributes(beatmap, mods))
+            task.add_done_callback(functools.partial(self._on_shared_task_done, calculations, key))
+            calculations[key] = task
 
+        # shielded so a cancelled request doesn't cancel the calculation for everyone else
+        return await asyncio.shield(task)
+
+    async def _get_beatmap_attributes(self, beatmap: "ResolvedBeatmap", mods: int) -> "BeatmapDifficultyAttributes":
+        difficulty = await BeatmapDifficultyAttributes.objects.filter(
+            checksum=beatmap.checksum,
+            mods=mods,
+            rosu_version=ROSU_VERSION
+        ).afirst()
+
+        if difficulty is None:
+            osu_path = await self.ensure_cached(beatmap)
+
+            try:
+                values, pid, stats = await self._run_calculation(
+                    difficulty_calc.calculate,
+                    osu_path,
+                    beatmap.checksum,
+                    mods
+                )
+            except (difficulty_calc.CorruptBeatmapError, FileNotFoundError) as exc:
+                # pruned between being cached and the worker opening it, or damaged
+                reason = "was pruned" if isinstance(exc, FileNotFoundError) else "is corrupt"
+                log.warning(f"Cached beatmap {beatmap.checksum} {reason}, downloading it again")
+                osu_path = await self.ensure_cached(beatmap, invalidate=True)
+                values, pid, stats = await self._run_calculation(
+                    difficulty_calc.calculate,
+                    osu_path,
+                    beatmap.checksum,
+                    mods
+                )
+            self._parsed_beatmap_stats[pid] = stats
+
+            # another request may have calculated the same thing in the meantime
+            difficulty = (await BeatmapDifficultyAttributes.objects.aget_or_create(
+                checksum=beatmap.checksum,
+                mods=mods,
+                rosu_version=ROSU_VERSION,
+                defaults={"beatmap_id": beatmap.id, **values}
+            ))[0]
+
+        self._difficulties.set((beatmap.checksum, mods), difficulty)
         return difficulty
 
 
 beatmap_cache = BeatmapCacheManager()
 
 
+class ResolvedBeatmap:
+    """The parts of a beatmap needed to store it in a mappool, from either the osu api or the database"""
+
+    __slots__ = (
+        "id", "checksum", "mode", "version", "ar", "accuracy", "cs", "drain", "total_length", "bpm",
+        "beatmapset_id", "artist", "title", "creator", "fetched_at"
+    )
+
+    def __init__(self, **kwargs):
+        for attr in self.__slots__:
+            setattr(self, attr, kwargs[attr])
+
+    @classmethod
+    def from_api(cls, beatmap: Beatmap, fetched_at: datetime) -> "ResolvedBeatmap":
+        return cls(
+            id=beatmap.id,
+            checksum=beatmap.checksum,
+            mode=beatmap.mode,
+            version=beatmap.version,
+            ar=beatmap.ar,
+            accuracy=beatmap.accuracy,
+            cs=beatmap.cs,
+            drain=beatmap.drain,
+            total_length=beatmap.total_length,
+            bpm=beatmap.bpm,
+            beatmapset_id=beatmap.beatmapset.id,
+            artist=beatmap.beatmapset.artist,
+            title=beatmap.beatmapset.title,
+            creator=beatmap.beatmapset.creator,
+            fetched_at=fetched_at
+        )
+
+    @classmethod
+    def from_db(cls, mappool_beatmap: "MappoolBeatmap") -> "ResolvedBeatmap":
+        bm = mappool_beatmap.beatmap_metadata
+        bms = mappool_beatmap.beatmapset_metadata
+        return cls(
+            id=bm.id,
+            checksum=bm.checksum,
+            # only osu!std beatmaps are stored
+            mode=GameModeStr.STANDARD,
+            version=bm.difficulty,
+            ar=bm.ar,
+            accuracy=bm.od,
+            cs=bm.cs,
+            drain=bm.hp,
+            total_length=bm.length,
+            bpm=bm.bpm,
+            beatmapset_id=bms.id,
+            artist=bms.artist,
+            title=bms.title,
+            creator=bms.creator,
+            fetched_at=bm.fetched_at
+        )
+
+
+class BeatmapResolver:
+    """Serves beatmaps from memory and the database while they're fresh, and only asks the osu api for the rest"""
+
+    def __init__(self) -> None:
+        # beatmap id -> (beatmap or None if it doesn't exist, expiry time)
+        self._beatmaps = LRUCache(settings.BEATMAP_METADATA_CACHE_SIZE)
+        self._semaphore = LoopLocal(lambda: asyncio.Semaphore(settings.BEATMAP_LOOKUP_CONCURRENCY))
+
+    def _remember(self, beatmap_id: int, beatmap: ResolvedBeatmap | None, expires_at: datetime):
+        self._beatmaps.set(beatmap_id, (beatmap, expires_at))
+
+    async def invalidate(self, beatmap_id: int):
+        """Makes the next lookup ask the osu api, e.g. once the beatmap is known to have been updated"""
+        self._beatmaps.pop(beatmap_id)
+        await BeatmapMetadata.objects.filter(id=beatmap_id).aupdate(fetched_at=None)
+
+    @staticmethod
+    async def _get_stored(beatmap_ids: set[int], fresh_after: datetime) -> list[ResolvedBeatmap]:
+        # beatmapset metadata is only linked to beatmaps through mappool beatmaps
+        queryset = MappoolBeatmap.objects.filter(
+            beatmap_metadata_id__in=beatmap_ids,
+            beatmap_metadata__fetched_at__gt=fresh_after
+        ).select_related(
+            "beatmap_metadata",
+            "beatmapset_metadata"
+        ).order_by("beatmap_metadata_id").distinct("beatmap_metadata_id")
+
+        return [ResolvedBeatmap.from_db(mappool_beatmap) async for mappool_beatmap in queryset]
+
+    async def _fetch_batch(self, beatmap_ids: tuple[int, ...]):
+        async with self._semaphore.get():
+            return await osu_client.get_beatmaps(beatmap_ids)
+
+    async def _fetch(self, beatmap_ids: set[int]) -> list[ResolvedBeatmap]:
+        now = timezone.now()
+        batches = await asyncio.gather(*(
+            self._fetch_batch(batch)
+            # the most beatmaps the osu api returns per request
+            for batch in itertools.batched(beatmap_ids, 50)
+        ))
+        return [ResolvedBeatmap.from_api(beatmap, now) for beatmap in itertools.chain(*batches)]
+
+    async def get_beatmaps(self, beatmap_ids: Iterable[int]) -> dict[int, ResolvedBeatmap | None]:
+        """Returns beatmap id -> beatmap, or None if there's no beatmap with that id"""
+        now = timezone.now()
+        ttl = timedelta(seconds=settings.BEATMAP_METADATA_TTL)
+        beatmap_ids = set(beatmap_ids)
+        beatmaps = {}
+
+        for beatmap_id in beatmap_ids:
+            entry = self._beatmaps.get(beatmap_id)
+            if entry is not None and entry[1] > now:
+                beatmaps[beatmap_id] = entry[0]
+
+        missing = beatmap_ids - beatmaps.keys()
+        if len(missing) > 0:
+            for beatmap in await self._get_stored(missing, now - ttl):
+                self._remember(beatmap.id, beatmap, beatmap.fetched_at + ttl)
+                beatmaps[beatmap.id] = beatmap
+                missing.discard(beatmap.id)
+
+        if len(missing) > 0:
+            for beatmap in await self._fetch(missing):
+                self._remember(beatmap.id, beatmap, now + ttl)
+                beatmaps[beatmap.id] = beatmap
+                missing.discard(beatmap.id)
+
+            invalid_expires_at = now + timedelta(seconds=settings.BEATMAP_METADATA_MISSING_TTL)
+            for beatmap_id in missing:
+                self._remember(beatmap_id, None, invalid_expires_at)
+                beatmaps[beatmap_id] = None
+
+        return beatmaps
+
+
+beatmap_resolver = BeatmapResolver()
+
+
+class UserResolver:
+    """Resolves osu users into the rows they're stored as in main_osuuser.
+
+    Users come from memory, then from main_osuuser if they were fetched recently enough,
+    and only the rest are requested from the osu api and stored for next time."""
+
+    def __init__(self) -> None:
+        # user id -> ((id, username, avatar, cover), expiry time)
+        self._users = LRUCache(settings.USER_CACHE_SIZE)
+        self._semaphore = LoopLocal(lambda: asyncio.Semaphore(settings.USER_LOOKUP_CONCURRENCY))
+
+    async def _fetch(self, user_ids: tuple[int, ...]):
+        async with self._semaphore.get():
+            return await osu_client.get_users(user_ids)
+
+    @staticmethod
+    async def _get_stored(user_ids: Iterable[int]) -> dict[int, tuple]:
+        fetched_after = timezone.now() - timedelta(seconds=settings.USER_REFRESH_INTERVAL)
+        return {
+            row[0]: row
+            async for row in OsuUser.objects.filter(
+                id__in=user_ids,
+                fetched_at__gte=fetched_after
+            ).values_list("id", "username", "avatar", "cover")
+        }
+
+    async def _fetch_and_store(self, user_ids: Iterable[int]) -> dict[int, tuple]:
+        batches = await asyncio.gather(*(
+            self._fetch(batch)
+            # the most users the osu api returns per request
+            for batch in itertools.batched(user_ids, 50)
+        ))
+
+        fetched_at = timezone.now()
+        users = {
+            user.id: OsuUser(
+                id=user.id,
+                username=user.username,
+                avatar=user.avatar_url,
+                cover=user.cover.url,
+                fetched_at=fetched_at
+            )
+            for user in itertools.chain(*batches)
+        }
+        if len(users) > 0:
+            await OsuUser.objects.abulk_create(
+                users.values(),
+                update_conflicts=True,
+                unique_fields=["id"],
+                update_fields=["username", "avatar", "cover", "fetched_at"]
+            )
+
+        return {user.id: (user.id, user.username, user.avatar, user.cover) for user in users.values()}
+
+    async def get_users(self, user_ids: Iterable[int]) -> dict[int, tuple]:
+        """Returns user id -> row data for each user that exists"""
+        user_ids = set(user_ids)
+        now = time.monotonic()
+        users = {}
+
+        for user_id in user_ids:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[1] > now:
+                users[user_id] = entry[0]
+
+        missing = user_ids - users.keys()
+        found = await self._get_stored(missing) if len(missing) > 0 else {}
+        missing -= found.keys()
+        if len(missing) > 0:
+            found.update(await self._fetch_and_store(missing))
+
+        expires_at = now + settings.USER_CACHE_TTL
+        for user_id, row in found.items():
+            self._users.set(user_id, (row, expires_at))
+
+        users.update(found)
+        return users
+
+
+user_resolver = UserResolver()
+
+
 class UserRoles(IntFlag):
     REFEREE = 1 << 0
     STREAMER = 1 << 1
@@ -116,6 +811,9 @@ class BeatmapMetadata(SerializableModel):
     hp = models.FloatField()
     length = models.PositiveIntegerField()
     bpm = models.FloatField()
+    checksum = models.CharField(max_length=32, default="")
+    # when this was last updated from the osu api
+    fetched_at = models.DateTimeField(null=True)
 
     class Serialization:
         FIELDS = ["id", "difficulty", "ar", "od", "cs", "hp", "length", "bpm"]
@@ -137,33 +835,111 @@ class BeatmapMod(SerializableModel):
         ]
 
 
+class BeatmapDifficultyAttributes(SerializableModel):
+    beatmap_id = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=32)
+    mods = models.PositiveIntegerField()
+    rosu_version = models.CharField(max_length=16)
+    star_rating = models.FloatField()
+    max_combo = models.PositiveIntegerField()
+    ar = models.FloatField()
+    od = models.FloatField()
+    cs = models.FloatField()
+    hp = models.FloatField()
+    bpm = models.FloatField()
+
+    class Serialization:
+        FIELDS = ["beatmap_id", "mods", "star_rating", "max_combo", "ar", "od", "cs", "hp", "bpm"]
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["checksum", "mods", "rosu_version"],
+                name="beatmapdifficultyattributes_unique_constraint"
+            )
+        ]
+
+    @staticmethod
+    async def get_for_mappool_beatmaps(
+        mappool_beatmaps: Iterable["MappoolBeatmap"]
+    ) -> dict[int, "BeatmapDifficultyAttributes"]:
+        """Mappool beatmap id -> attributes with its mods applied, for the ones that have been calculated.
+        The mappool beatmaps need their beatmap metadata and mods loaded."""
+        keys = {
+            mappool_beatmap.id: (
+                mappool_beatmap.beatmap_metadata.checksum,
+                MappoolBeatmap.get_mods_flag(mod.acronym for mod in mappool_beatmap.mods.all())
+            )
+            for mappool_beatmap in mappool_beatmaps
+        }
+        if len(keys) == 0:
+            return {}
+
+        difficulties = {
+            (difficulty.checksum, difficulty.mods): difficulty
+            async for difficulty in BeatmapDifficultyAttributes.objects.filter(
+                checksum__in={checksum for checksum, _ in keys.values()},
+                mods__in={mods for _, mods in keys.values()},
+                rosu_version=ROSU_VERSION
+            )
+        }
+        return {
+            mappool_beatmap_id: difficulties[key]
+            for mappool_beatmap_id, key in keys.items()
+            if key in difficulties
+        }
+
+
 class MappoolBeatmap(SerializableModel):
     beatmapset_metadata = models.ForeignKey(BeatmapsetMetadata, models.PROTECT, related_name="mappool_beatmaps")
     beatmap_metadata = models.ForeignKey(BeatmapMetadata, models.PROTECT, related_name="mappool_beatmaps")
     mods = models.ManyToManyField(BeatmapMod, "related_beatmaps")
     star_rating = models.FloatField()
+    # identifies the mods independent of their order, see get_mods_signature
+    signature = models.CharField(default="")
 
     class Serialization:
         FIELDS = ["id", "star_rating"]
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["beatmap_metadata", "signature"],
+                name="mappoolbeatmap_unique_constraint"
+            )
+        ]
+
+    @staticmethod
+    def get_mods_signature(mods: Iterable[tuple[str, dict]]) -> str:
+        """e.g. "DT,HD" for (acronym, settings) pairs of HD and DT with no settings"""
+        return ",".join(sorted(set(
+            acronym + (json.dumps(settings, sort_keys=True, separators=(",", ":")) if settings else "")
+            for acronym, settings in mods
+        )))
+
     @staticmethod
-    async def get_rows_data(beatmap: Beatmap, mods: tuple[str | None, ...]):
+    def get_mods_flag(mods: Iterable[str | None]) -> int:
         mods_flag = 0
         for mod in filter(lambda m: m is not None, mods):
             try:
                 mods_flag += Mods[Mod(mod).name].value
             except AttributeError:
                 continue
-        difficulty = await beatmap_cache.get_beatmap_attributes(beatmap, mods_flag)
 
-        bms = beatmap.beatmapset
+        return mods_flag
+
+    @staticmethod
+    async def get_rows_data(beatmap: ResolvedBeatmap, mods: tuple[str | None, ...], star_rating: float | None = None):
+        if star_rating is None:
+            mods_flag = MappoolBeatmap.get_mods_flag(mods)
+            star_rating = (await beatmap_cache.get_beatmap_attributes(beatmap, mods_flag)).star_rating
 
         return (
             (  # beatmapset metadata
-                bms.id,
-                bms.artist,
-                bms.title,
-                bms.creator
+                beatmap.beatmapset_id,
+                beatmap.artist,
+                beatmap.title,
+                beatmap.creator
             ),
             (  # beatmap metadata
                 beatmap.id,
@@ -173,12 +949,15 @@ class MappoolBeatmap(SerializableModel):
                 beatmap.cs,
                 beatmap.drain,
                 beatmap.total_length,
-                beatmap.bpm
+                beatmap.bpm,
+                beatmap.checksum,
+                beatmap.fetched_at
             ),
             (  # mappool beatmap
-                difficulty.stars,
+                star_rating,
                 beatmap.id,
-                bms.id
+                beatmap.beatmapset_id,
+                MappoolBeatmap.get_mods_signature((mod, {}) for mod in mods if mod is not None)
             ),
             (
                 mods
@@ -198,6 +977,73 @@ class MappoolBeatmapConnection(SerializableModel):
         FIELDS = ["slot"]
 
 
+MAPPOOL_BEATMAP_TYPE = CompositeType("database_mappoolbeatmap")
+BEATMAP_METADATA_TYPE = CompositeType("database_beatmapmetadata")
+BEATMAPSET_METADATA_TYPE = CompositeType("database_beatmapsetmetadata")
+BEATMAP_MOD_TYPE = CompositeType("database_beatmapmod")
+
+
+# Trending scores use forward decay: a favorite's weight grows exponentially with its
+# timestamp instead of every score shrinking as time passes. Ordering by the sum is
+# the same as ordering by the decayed score at any point in time, so scores only
+# change when favorites are added or removed. The weights would overflow a float, so
+# the score stored is ln(1 + sum of the weights), which orders the same way.
+TRENDING_RATE = math.log(2) / settings.TRENDING_HALF_LIFE
+
+
+def get_trending_weight(timestamp: int) -> float:
+    """ln of the weight of a favorite made at timestamp"""
+    return timestamp * TRENDING_RATE
+
+
+def add_trending_weight(weight: float):
+    """trending_score with a favorite's weight added, ln(exp(score) + exp(weight)) computed without overflowing"""
+    score, weight = models.F("trending_score"), models.Value(weight)
+    # exp underflowing is an error in postgres; anything below exp(-700) doesn't change the result anyway
+    return Greatest(score, weight) + Ln(1 + Exp(Greatest(-Abs(score - weight), models.Value(-700.0))))
+
+
+def trending_score_expression(timestamp: str = "timestamp"):
+    """The trending score of a group of favorites, see sql/trending.sql"""
+    return models.Func(
+        ArrayAgg(timestamp),
+        models.Value(TRENDING_RATE),
+        function="trending_score",
+        output_field=models.FloatField()
+    )
+
+
+def _aggregate_favorites(favorite_model, field: str, aggregate, output_field, default):
+    """aggregate over the favorites of each row, for updating the row's stored value"""
+    favorites = favorite_model.objects.filter(
+        **{field: models.OuterRef("id")}
+    ).order_by().values(field).annotate(value=aggregate).values("value")
+    return Coalesce(models.Subquery(favorites, output_field=output_field), models.Value(default))
+
+
+def refresh_trending_scores(model, favorite_model, field: str) -> int:
+    """Recomputes the trending score of every row from its favorites.
+
+    Scores are kept current as favorites change, this corrects anything that didn't go
+    through that (like favorites deleted along with their user) and float error."""
+    return model.objects.update(trending_score=_aggregate_favorites(
+        favorite_model, field, trending_score_expression(), models.FloatField(), 0.0
+    ))
+
+
+def reconcile_favorite_counts(model, favorite_model, field: str) -> int:
+    """Sets favorite_count to the actual number of favorites wherever it's off and returns how many rows were"""
+    actual = _aggregate_favorites(favorite_model, field, models.Count("id"), models.IntegerField(), 0)
+    return model.objects.alias(actual=actual).exclude(favorite_count=models.F("actual")).update(favorite_count=actual)
+
+
+class SearchableManager(models.Manager):
+    """search_vector is only used to filter, so it's never loaded into instances"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer("search_vector")
+
+
 class Mappool(SerializableModel):
     name = models.CharField(max_length=128)
     description = models.CharField(max_length=1024, default="")
@@ -205,37 +1051,104 @@ class Mappool(SerializableModel):
     submitted_by = models.ForeignKey(OsuUser, models.SET_NULL, related_name="submitted_mappools", null=True)
     favorites = models.ManyToManyField(OsuUser, through="MappoolFavorite", related_name="mappool_favorites")
     avg_star_rating = models.FloatField()
+    # name, plus the text of connected tournaments; kept current by sql/search_vectors.sql
+    search_vector = SearchVectorField(null=True)
+    # ln(1 + sum of the weights of the favorites), see TRENDING_RATE
+    trending_score = models.FloatField(default=0)
+    # kept current by add_favorite and remove_favorite, so reads never have to count favorites
+    favorite_count = models.PositiveIntegerField(default=0)
+
+    objects = SearchableManager()
 
     class Serialization:
         FIELDS = ["id", "name", "description", "avg_star_rating"]
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="mappool_search_vector_index"),
+            models.Index(fields=["trending_score", "id"], name="mappool_trending_index"),
+            models.Index(fields=["favorite_count", "id"], name="mappool_favorites_index")
+        ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @staticmethod
     def _new_mappool(cls, id: int, name: str, description: str, slots: list[str], submitted_by: OsuUser | None, data: list[tuple[tuple, tuple, tuple, tuple]]):
-        n_beatmaps = len(slots)
-
-        slots_string = f"ARRAY[{','.join(('%s' for _ in range(n_beatmaps)))}]"
-        mp_beatmaps_string = f"ARRAY[{','.join(('ROW(0, %s, %s, %s)::database_mappoolbeatmap' for _ in range(n_beatmaps)))}]"
-        beatmaps_string = f"ARRAY[{','.join(('ROW(%s, %s, %s, %s, %s, %s, %s, %s)::database_beatmapmetadata' for _ in range(n_beatmaps)))}]"
-        beatmapsets_string = f"ARRAY[{','.join(('ROW(%s, %s, %s, %s)::database_beatmapsetmetadata' for _ in range(n_beatmaps)))}]"
-        mods_string = f"ARRAY[{','.join(('ROW(0,%s,\'\x7B\x7D\')' for _ in range(len(data[0][3]))))}]::database_beatmapmod[]"
-        all_mods_string = f"ARRAY[{','.join((mods_string for _ in range(n_beatmaps)))}]"
-
-        with connection.cursor() as cursor:
-            cursor.execute(f"SELECT \"new_mappool\"(%s::text, %s::text, %s, {slots_string}, {mp_beatmaps_string}, {beatmaps_string}, {beatmapsets_string}, {all_mods_string}, %s)", (
+        # every beatmap has the same number of mods (padded with None), and a
+        # multidimensional array can't have empty rows
+        if len(data[0][3]) == 0:
+            mods = []
+        else:
+            mods = [
+                [BEATMAP_MOD_TYPE.row((0, mod, Jsonb({}))) for mod in entry[3]]
+                for entry in data
+            ]
+
+        mappool_id = call_function(
+            "SELECT new_mappool(%s::text, %s::text, %s::integer, %s::varchar[], %s::database_mappoolbeatmap[], "
+            "%s::database_beatmapmetadata[], %s::database_beatmapsetmetadata[], %s::database_beatmapmod[], %s::integer)",
+            (
                 name,
                 description,
                 None if submitted_by is None else submitted_by.id,
-                *slots,
-                *itertools.chain(*itertools.chain(entry[2] for entry in data)),
-                *itertools.chain(*itertools.chain(entry[1] for entry in data)),
-                *itertools.chain(*itertools.chain(entry[0] for entry in data)),
-                *itertools.chain(*itertools.chain(entry[3] for entry in data)),
+                slots,
+                [MAPPOOL_BEATMAP_TYPE.row((0, *entry[2])) for entry in data],
+                [BEATMAP_METADATA_TYPE.row(entry[1]) for entry in data],
+                [BEATMAPSET_METADATA_TYPE.row(entry[0]) for entry in data],
+                mods,
                 id
-            ))
-            return cls(id=cursor.fetchone()[0], name=name, description=description, submitted_by=submitted_by)
+            ),
+            (MAPPOOL_BEATMAP_TYPE, BEATMAP_METADATA_TYPE, BEATMAPSET_METADATA_TYPE, BEATMAP_MOD_TYPE)
+        )
+        return cls(id=mappool_id, name=name, description=description, submitted_by=submitted_by)
+
+    @classmethod
+    async def get_rows_data(cls, beatmap_ids: list[int], mods: list[list[str]], mappool_id: int = 0):
+        """Resolves the beatmaps and their star ratings into the data new_mappool takes"""
+        max_mods = max(map(len, mods))
+        mods = [
+            tuple(map(str.upper, beatmap_mods)) + tuple((None for _ in range(max_mods - len(beatmap_mods))))
+            for beatmap_mods in mods
+        ]
+        signatures = [
+            MappoolBeatmap.get_mods_signature((mod, {}) for mod in beatmap_mods if mod is not None)
+            for beatmap_mods in mods
+        ]
+
+        # beatmaps that stay in an edited mappool with the same mods don't need to be resolved again
+        existing = {}
+        if mappool_id != 0:
+            async for mappool_beatmap in MappoolBeatmap.objects.filter(
+                mappool_connections__mappool_id=mappool_id
+            ).select_related("beatmap_metadata", "beatmapset_metadata"):
+                existing[(mappool_beatmap.beatmap_metadata_id, mappool_beatmap.signature)] = mappool_beatmap
+
+        resolved = await beatmap_resolver.get_beatmaps([
+            beatmap_id for beatmap_id, signature in zip(beatmap_ids, signatures)
+            if (beatmap_id, signature) not in existing
+        ])
+
+        invalid_ids = [beatmap_id for beatmap_id, beatmap in resolved.items() if beatmap is None]
+        if len(invalid_ids) > 0:
+            raise ClientException(f"Invalid beatmap id(s): {', '.join(map(str, invalid_ids))}")
+
+        for beatmap in resolved.values():
+            if beatmap.mode != GameModeStr.STANDARD:
+                raise ClientException("Sorry! Only osu!std mappools are supported at the moment.")
+
+        def get_rows_data(beatmap_id, beatmap_mods, signature):
+            mappool_beatmap = existing.get((beatmap_id, signature))
+            if mappool_beatmap is None:
+                return MappoolBeatmap.get_rows_data(resolved[beatmap_id], beatmap_mods)
+
+            return MappoolBeatmap.get_rows_data(
+                ResolvedBeatmap.from_db(mappool_beatmap),
+                beatmap_mods,
+                mappool_beatmap.star_rating
+            )
+
+        return await asyncio.gather(*map(get_rows_data, beatmap_ids, mods, signatures))
 
     @classmethod
     async def new(
@@ -248,39 +1161,54 @@ class Mappool(SerializableModel):
         mods: list[list[str]],
         mappool_id: int = 0
     ):
-        beatmaps = await osu_client.get_beatmaps(beatmap_ids)
-
-        for beatmap in beatmaps:
-            if beatmap.mode != GameModeStr.STANDARD:
-                raise ClientException("Sorry! Only osu!std mappools are supported at the moment.")
+        data = await cls.get_rows_data(beatmap_ids, mods, mappool_id)
+        return await sync_to_async(cls._new_mappool)(cls, mappool_id, name, description, slots, submitted_by, data)
 
-        unique_beatmap_ids = set(beatmap_ids)
-        if len(beatmaps) != len(unique_beatmap_ids):
-            raise ClientException(
-                f"Invalid beatmap id(s): "
-                f"{', '.join(map(str, find_invalids(beatmaps, unique_beatmap_ids, lambda b, id: b.id == id)))}"
+    async def is_favorited(self, user_id: int):
+        return await MappoolFavorite.objects.filter(mappool_id=self.id, user_id=user_id).aexists()
+
+    def _add_favorite(self, user_id: int, timestamp: int):
+        with transaction.atomic():
+            # only the request that actually created it adds it to the stored stats
+            _, created = MappoolFavorite.objects.get_or_create(
+                mappool_id=self.id,
+                user_id=user_id,
+                defaults={"timestamp": timestamp}
             )
+            if created:
+                Mappool.objects.filter(id=self.id).update(
+                    favorite_count=models.F("favorite_count") + 1,
+                    trending_score=add_trending_weight(get_trending_weight(timestamp))
+                )
 
-        beatmaps = [next((beatmap for beatmap in beatmaps if beatmap.id == id)) for id in beatmap_ids]
-
-        max_mods = max(map(len, mods))
-        data = await asyncio.gather(*(
-            MappoolBeatmap.get_rows_data(
-                beatmaps[i],
-                tuple(map(str.upper, mods[i])) + tuple((None for _ in range(max_mods - len(mods[i]))))
-            )
-            for i in range(len(beatmaps))
-        ))
+    def _remove_favorite(self, favorite):
+        with transaction.atomic():
+            # only the request that actually deleted it takes it off the stored stats
+            deleted, _ = MappoolFavorite.objects.filter(id=favorite.id).delete()
+            if deleted > 0:
+                # taking a weight back off a score loses precision, so it's counted again instead
+                Mappool.objects.filter(id=self.id).update(
+                    # a count that drifted to 0 can't go negative
+                    favorite_count=Greatest(models.F("favorite_count") - 1, models.Value(0)),
+                    trending_score=_aggregate_favorites(
+                        MappoolFavorite, "mappool", trending_score_expression(), models.FloatField(), 0.0
+                    )
+                )
 
-        return await sync_to_async(cls._new_mappool)(cls, mappool_id, name, description, slots, submitted_by, data)
+    async def add_favorite(self, user_id: int):
+        await sync_to_async(self._add_favorite)(user_id, int(time.time()))
 
-    async def is_favorited(self, user_id: int):
-        return await MappoolFavorite.objects.filter(mappool_id=self.id, user_id=user_id).acount() > 0
+    async def remove_favorite(self, favorite):
+        await sync_to_async(self._remove_favorite)(favorite)
 
     def __str__(self):
         return self.name
 
 
+OSU_USER_TYPE = CompositeType("main_osuuser")
+MAPPOOL_CONNECTION_TYPE = CompositeType("database_mappoolconnection")
+
+
 class Tournament(SerializableModel):
     name = models.CharField(max_length=128, unique=True)
     abbreviation = models.CharField(max_length=16, default="")
@@ -290,6 +1218,14 @@ class Tournament(SerializableModel):
     mappools = models.ManyToManyField(Mappool, through="MappoolConnection")
     submitted_by = models.ForeignKey(OsuUser, models.SET_NULL, related_name="submitted_tournaments", null=True)
     favorites = models.ManyToManyField(OsuUser, through="TournamentFavorite", related_name="tournament_favorites")
+    # kept current by sql/search_vectors.sql
+    search_vector = SearchVectorField(null=True)
+    # ln(1 + sum of the weights of the favorites), see TRENDING_RATE
+    trending_score = models.FloatField(default=0)
+    # kept current by add_favorite and remove_favorite, so reads never have to count favorites
+    favorite_count = models.PositiveIntegerField(default=0)
+
+    objects = SearchableManager()
 
     class Serialization:
         FIELDS = ["id", "name", "abbreviation", "link", "description"]
@@ -297,6 +1233,13 @@ class Tournament(SerializableModel):
             "involvements": "staff"
         }
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="tournament_search_vector_index"),
+            models.Index(fields=["trending_score", "id"], name="tournament_trending_index"),
+            models.Index(fields=["favorite_count", "id"], name="tournament_favorites_index")
+        ]
+
     @staticmethod
     def _new_tournament(
         cls,
@@ -310,30 +1253,42 @@ class Tournament(SerializableModel):
         mappools: list,
         tournament_id: int = 0
     ):
-        users_string = f"ARRAY[{','.join(('ROW(%s,%s,%s,%s,0)::main_osuuser' for _ in range(len(users))))}]::main_osuuser[]"
-        roles_string = f"ARRAY[{','.join(('%s' for _ in range(len(roles))))}]::integer[]"
-        mappools_string = f"ARRAY[{','.join(('ROW(0,%s,%s,0)::database_mappoolconnection' for _ in range(len(mappools))))}]::database_mappoolconnection[]"
-
-        with connection.cursor() as cursor:
-            cursor.execute(f"SELECT \"new_tournament\"(%s, %s, %s, %s, %s, %s, {users_string}, {roles_string}, {mappools_string})", (
+        tournament_id = call_function(
+            "SELECT new_tournament(%s::bigint, %s::varchar, %s::varchar, %s::varchar, %s::varchar, %s::bigint, "
+            "%s::main_osuuser[], %s::integer[], %s::database_mappoolconnection[])",
+            (
                 tournament_id,
                 name,
                 abbr,
                 description,
                 link,
                 submitted_by_id,
-                *itertools.chain(*users),
-                *roles,
-                *itertools.chain(*mappools)
-            ))
-            return cls(
-                id=cursor.fetchone()[0],
-                name=name,
-                abbreviation=abbr,
-                link=link,
-                description=description,
-                submitted_by_id=submitted_by_id
-            )
+                [OSU_USER_TYPE.row((*user, False, None)) for user in users],
+                roles,
+                [MAPPOOL_CONNECTION_TYPE.row((0, *mappool, 0)) for mappool in mappools]
+            ),
+            (OSU_USER_TYPE, MAPPOOL_CONNECTION_TYPE)
+        )
+        return cls(
+            id=tournament_id,
+            name=name,
+            abbreviation=abbr,
+            link=link,
+            description=description,
+            submitted_by_id=submitted_by_id
+        )
+
+    @staticmethod
+    async def get_users_data(staff: list) -> list[tuple]:
+        """Resolves the staff into the user rows new_tournament takes"""
+        user_ids = [user["id"] for user in staff]
+        users = await user_resolver.get_users(user_ids)
+
+        invalid_ids = [user_id for user_id in user_ids if user_id not in users]
+        if len(invalid_ids) > 0:
+            raise ClientException(f"Invalid user id(s): {', '.join(map(str, invalid_ids))}")
+
+        return [users[user_id] for user_id in user_ids]
 
     @classmethod
     async def new(
@@ -347,17 +1302,7 @@ class Tournament(SerializableModel):
         mappools: list,
         tournament_id: int = 0
     ):
-        user_ids = [user["id"] for user in staff]
-        users = []
-        for batch in itertools.batched(user_ids, 50):
-            batch_users = await osu_client.get_users(batch)
-            if len(batch_users) != len(batch):
-                raise ClientException(
-                    f"Invalid user id(s): "
-                    f"{', '.join(map(str, find_invalids(batch_users, user_ids, lambda u, id: u.id == id)))}"
-                )
-
-            users += sorted(batch_users, key=lambda u: user_ids.index(u.id))
+        users = await cls.get_users_data(staff)
 
         return await sync_to_async(cls._new_tournament)(
             cls,
@@ -366,19 +1311,48 @@ class Tournament(SerializableModel):
             description or "",
             link or "",
             submitted_by_id,
-            [(
-                user.id,
-                user.username,
-                user.avatar_url,
-                user.cover.url
-            ) for user in users],
+            users,
             [user["roles"] for user in staff],
             [(mappool["name_override"], mappool["id"]) for mappool in mappools],
             tournament_id
         )
     
     async def is_favorited(self, user_id: int):
-        return await TournamentFavorite.objects.filter(tournament_id=self.id, user_id=user_id).acount() > 0
+        return await TournamentFavorite.objects.filter(tournament_id=self.id, user_id=user_id).aexists()
+
+    def _add_favorite(self, user_id: int, timestamp: int):
+        with transaction.atomic():
+            # only the request that actually created it adds it to the stored stats
+            _, created = TournamentFavorite.objects.get_or_create(
+                tournament_id=self.id,
+                user_id=user_id,
+                defaults={"timestamp": timestamp}
+            )
+            if created:
+                Tournament.objects.filter(id=self.id).update(
+                    favorite_count=models.F("favorite_count") + 1,
+                    trending_score=add_trending_weight(get_trending_weight(timestamp))
+                )
+
+    def _remove_favorite(self, favorite):
+        with transaction.atomic():
+            # only the request that actually deleted it takes it off the stored stats
+            deleted, _ = TournamentFavorite.objects.filter(id=favorite.id).delete()
+            if deleted > 0:
+                # taking a weight back off a score loses precision, so it's counted again instead
+                Tournament.objects.filter(id=self.id).update(
+                    # a count that drifted to 0 can't go negative
+                    favorite_count=Greatest(models.F("favorite_count") - 1, models.Value(0)),
+                    trending_score=_aggregate_favorites(
+                        TournamentFavorite, "tournament", trending_score_expression(), models.FloatField(), 0.0
+                    )
+                )
+
+    async def add_favorite(self, user_id: int):
+        await sync_to_async(self._add_favorite)(user_id, int(time.time()))
+
+    async def remove_favorite(self, favorite):
+        await sync_to_async(self._remove_favorite)(favorite)
 
     def __str__(self):
         return self.name
@@ -423,6 +1397,11 @@ class MappoolFavorite(SerializableModel):
     class Serialization:
         FIELDS = ["timestamp"]
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["mappool", "user"], name="mappoolfavorite_unique_constraint")
+        ]
+
 
 class TournamentFavorite(SerializableModel):
     tournament = models.ForeignKey(Tournament, models.CASCADE, related_name="favorite_connections")
@@ -431,3 +1410,8 @@ class TournamentFavorite(SerializableModel):
 
     class Serialization:
         FIELDS = ["timestamp"]
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tournament", "user"], name="tournamentfavorite_unique_constraint")
+        ]
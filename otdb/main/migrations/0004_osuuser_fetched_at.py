@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_sqlfuncmigration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='osuuser',
+            name='fetched_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
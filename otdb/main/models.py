@@ -41,6 +41,8 @@ class OsuUser(SerializableModel):
     cover = models.CharField()
 
     is_admin = models.BooleanField(default=False)
+    # when username, avatar and cover were last fetched from the osu api, see UserResolver
+    fetched_at = models.DateTimeField(null=True)
 
     REQUIRED_FIELDS = []
     # this field has to be unique but there is a scenario where
@@ -63,13 +65,15 @@ class OsuUser(SerializableModel):
             user.username = data.username
             user.avatar = data.avatar_url
             user.cover = data.cover.url
+            user.fetched_at = datetime.now(tz=timezone.utc)
             return user
         except OsuUser.DoesNotExist:
             return cls(
                 id=data.id,
                 username=data.username,
                 avatar=data.avatar_url,
-                cover=data.cover.url
+                cover=data.cover.url,
+                fetched_at=datetime.now(tz=timezone.utc)
             )
 
     def __str__(self):
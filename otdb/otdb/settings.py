@@ -17,6 +17,8 @@ import os
 from pathlib import Path
 from osu import AsynchronousClient, AsynchronousAuthHandler, Scope
 
+from django.core.exceptions import ImproperlyConfigured
+
 from common.dummy_api import DummyClient
 
 
@@ -101,6 +103,25 @@ LOGGING["loggers"]["django.request"] = {
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# 1 = share a pool of open connections between requests, 0 = open one per request
+# (or reuse it for DB_CONN_MAX_AGE seconds)
+DB_POOL = bool(int(os.getenv("DB_POOL") or 1))
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE") or 2)
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE") or 10)
+# seconds to wait for a free connection before the request fails
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT") or 10)
+# seconds an unused connection above the min size stays open, and any connection at most
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE") or 10 * 60)
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME") or 60 * 60)
+# only without a pool; the pool already keeps connections open
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE") or 60)
+# 1 = check a connection still works before handing it out; django passes ConnectionPool.check_connection
+# to its pool when CONN_HEALTH_CHECKS is set
+DB_CONN_HEALTH_CHECKS = bool(int(os.getenv("DB_CONN_HEALTH_CHECKS") or 1))
+# times a query runs on a connection before psycopg prepares it there; unset = never, which
+# django defaults to since poolers in transaction mode (e.g. pgbouncer) can't keep prepared statements
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD")) if os.getenv("DB_PREPARE_THRESHOLD") else None
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -109,6 +130,37 @@ DATABASES = {
         "PASSWORD": os.getenv("PGPASSWORD"),
         "HOST": os.getenv("PGHOST"),
         "PORT": os.getenv("PGPORT"),
+        "CONN_MAX_AGE": 0 if DB_POOL else DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
+        "OPTIONS": {
+            **({
+                "pool": {
+                    "min_size": DB_POOL_MIN_SIZE,
+                    "max_size": DB_POOL_MAX_SIZE,
+                    "timeout": DB_POOL_TIMEOUT,
+                    "max_idle": DB_POOL_MAX_IDLE,
+                    "max_lifetime": DB_POOL_MAX_LIFETIME
+                }
+            } if DB_POOL else {}),
+            "prepare_threshold": DB_PREPARE_THRESHOLD
+        }
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# shared state like the listing count version (see api/views/listing.py); the default is per process.
+# e.g. django.core.cache.backends.db.DatabaseCache with a table name as the location (created with
+# manage.py createcachetable) shares it between processes without another service
+CACHE_BACKEND = os.getenv("CACHE_BACKEND") or "django.core.cache.backends.locmem.LocMemCache"
+CACHE_LOCATION = os.getenv("CACHE_LOCATION") or ""
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": CACHE_LOCATION
     }
 }
 
@@ -184,6 +236,78 @@ else:
     OSU_CLIENT = DummyClient(BASE_DIR)
 
 
+# Beatmap cache
+
+# bytes of .osu files kept on disk before the least recently used ones are deleted
+BEATMAP_CACHE_MAX_SIZE = int(os.getenv("BEATMAP_CACHE_MAX_SIZE") or 1024 * 1024 * 1024)
+# max number of .osu files downloaded from osu.ppy.sh at the same time
+BEATMAP_DOWNLOAD_CONCURRENCY = int(os.getenv("BEATMAP_DOWNLOAD_CONCURRENCY") or 2)
+# sustained downloads per second, and how many can be made at once after being idle
+BEATMAP_DOWNLOAD_RATE = float(os.getenv("BEATMAP_DOWNLOAD_RATE") or 1)
+BEATMAP_DOWNLOAD_BURST = int(os.getenv("BEATMAP_DOWNLOAD_BURST") or 5)
+# retries after a rate limit, server error or connection error
+BEATMAP_DOWNLOAD_RETRIES = int(os.getenv("BEATMAP_DOWNLOAD_RETRIES") or 3)
+# number of difficulty calculations kept in memory in front of the database
+BEATMAP_DIFFICULTY_CACHE_SIZE = int(os.getenv("BEATMAP_DIFFICULTY_CACHE_SIZE") or 4096)
+# "process" or "thread"; rosu holds the GIL while calculating, so only a process
+# pool actually keeps calculations from blocking the event loop
+BEATMAP_CALC_EXECUTOR = os.getenv("BEATMAP_CALC_EXECUTOR") or "process"
+BEATMAP_CALC_WORKERS = int(os.getenv("BEATMAP_CALC_WORKERS") or 2)
+# max number of calculations queued for a worker before callers have to wait
+BEATMAP_CALC_QUEUE_SIZE = int(os.getenv("BEATMAP_CALC_QUEUE_SIZE") or 32)
+# calculations for common mods of newly downloaded beatmaps run at most this many at a time,
+# so they don't hold up calculations that requests are waiting on
+BEATMAP_PRECOMPUTE_CONCURRENCY = int(os.getenv("BEATMAP_PRECOMPUTE_CONCURRENCY") or 1)
+# approximate bytes of parsed beatmaps each calculation worker keeps in memory
+BEATMAP_PARSED_CACHE_SIZE = int(os.getenv("BEATMAP_PARSED_CACHE_SIZE") or 64 * 1024 * 1024)
+# seconds beatmap info from the osu api is reused before being fetched again
+BEATMAP_METADATA_TTL = int(os.getenv("BEATMAP_METADATA_TTL") or 24 * 60 * 60)
+# seconds a beatmap id the osu api didn't return stays known as invalid
+BEATMAP_METADATA_MISSING_TTL = int(os.getenv("BEATMAP_METADATA_MISSING_TTL") or 10 * 60)
+# number of beatmaps kept in memory in front of the database
+BEATMAP_METADATA_CACHE_SIZE = int(os.getenv("BEATMAP_METADATA_CACHE_SIZE") or 4096)
+# max number of requests for beatmaps made to the osu api at the same time
+BEATMAP_LOOKUP_CONCURRENCY = int(os.getenv("BEATMAP_LOOKUP_CONCURRENCY") or 4)
+
+# Listings
+
+# seconds the total count of a listing (per filters and search query) is reused for. counts are
+# cached in each worker process and a write resets them through a version kept in CACHES; with the
+# default per-process cache other processes can show counts up to this many seconds out of date
+LISTING_COUNT_CACHE_TTL = int(os.getenv("LISTING_COUNT_CACHE_TTL") or 10)
+LISTING_COUNT_CACHE_SIZE = int(os.getenv("LISTING_COUNT_CACHE_SIZE") or 1024)
+# pages after this can only be reached with the cursor of the page before, so an OFFSET
+# never skips more than this many pages of rows
+LISTING_MAX_PAGE = int(os.getenv("LISTING_MAX_PAGE") or 20)
+
+# Trending
+
+# seconds after which a favorite counts half as much towards trending
+TRENDING_HALF_LIFE = int(os.getenv("TRENDING_HALF_LIFE") or 3 * 24 * 60 * 60)
+if TRENDING_HALF_LIFE <= 0:
+    raise ImproperlyConfigured("TRENDING_HALF_LIFE must be a positive number of seconds")
+# unix time the scores backfilled by migration 0021 grew from, before scores were stored as
+# logs; 0023 recomputes them, and nothing else uses it
+TRENDING_EPOCH = int(os.getenv("TRENDING_EPOCH") or 1735689600)
+
+# User cache
+
+# seconds osu user info is reused before being fetched again
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL") or 10 * 60)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE") or 4096)
+# seconds a user stored in main_osuuser is used before being fetched from the osu api again
+USER_REFRESH_INTERVAL = int(os.getenv("USER_REFRESH_INTERVAL") or 24 * 60 * 60)
+# max number of requests for users made to the osu api at the same time
+USER_LOOKUP_CONCURRENCY = int(os.getenv("USER_LOOKUP_CONCURRENCY") or 4)
+
+# Imports
+
+# max number of lines read from one import request
+IMPORT_MAX_LINES = int(os.getenv("IMPORT_MAX_LINES") or 10000)
+# max bytes a line of an import request can be
+IMPORT_MAX_LINE_SIZE = int(os.getenv("IMPORT_MAX_LINE_SIZE") or 1024 * 1024)
+
+
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 if not IS_GITHUB_WORKFLOW:
@@ -2,7 +2,7 @@ import { EventManager } from "./event";
 import { getCookies } from "./util";
 import { ValidMod } from "./constants";
 
-export type ListingSortType = "recent" | "favorites" | "trending";
+export type ListingSortType = "recent" | "favorites" | "trending" | "relevance";
 
 export interface User {
     id: number;
@@ -57,11 +57,25 @@ export interface Mod {
     settings: Object | null;
 }
 
+export interface BeatmapDifficultyAttributes {
+    beatmap_id: number;
+    mods: number;
+    star_rating: number;
+    max_combo: number;
+    ar: number;
+    od: number;
+    cs: number;
+    hp: number;
+    bpm: number;
+}
+
 export interface MappoolBeatmap {
     beatmapset_metadata: BeatmapsetMetadata;
     beatmap_metadata: BeatmapMetadata;
     mods: Mod[];
     star_rating: number;
+    // with the mods applied; only on full mappools, and null until it's been calculated
+    difficulty?: BeatmapDifficultyAttributes | null;
 }
 
 export interface MappoolBeatmapConnection {
@@ -90,6 +104,9 @@ export interface MappoolWithFavorites extends Mappool {
 export interface MappoolsResponse {
     data: MappoolWithFavorites[];
     total_pages: number;
+    next_cursor: string | null;
+    // pages after this are only loaded with the cursor of the page before
+    max_page: number;
 }
 
 export interface MappoolBeatmapPayload {
@@ -150,6 +167,9 @@ export interface TournamentWithFavorites extends Tournament {
 export interface TournamentsResponse {
     data: TournamentWithFavorites[];
     total_pages: number;
+    next_cursor: string | null;
+    // pages after this are only loaded with the cursor of the page before
+    max_page: number;
 }
 
 export interface TournamentStaffPayload {
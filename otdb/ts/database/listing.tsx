@@ -25,7 +25,7 @@ export function createListingItem(id: number, title: string, favoriteCount: numb
 
 export function createListing<T>(
     listingContainer: HTMLElement,
-    getData: (searchParams: URLSearchParams) => Promise<{data: T[], total_pages: number}>,
+    getData: (searchParams: URLSearchParams) => Promise<{data: T[], total_pages: number, next_cursor: string | null, max_page: number}>,
     createListingItem: (item: T) => Element,
     searchParams: URLSearchParams
 ): () => void {
@@ -33,8 +33,15 @@ export function createListing<T>(
     let sort: string = params.get("s") ?? "recent";
     let page: number = parseInt(params.get("p") ?? "1");
     let query: string = params.get("q") ?? "";
+    let nextCursor: string | null = null;
+    let maxPage: number = Infinity;
     let currentSortElm = null;
 
+    // relevance needs a search query to rank by
+    if (sort === "relevance" && query === "") {
+        sort = "recent";
+    }
+
     searchParams.set("s", sort);
     searchParams.set("p", page.toString());
     searchParams.set("q", query);
@@ -44,7 +51,7 @@ export function createListing<T>(
 
     searchInput.value = query;
 
-    function loadPage() {
+    function loadPage(cursor: string | null = null) {
         window.history.replaceState(
             Object.fromEntries(searchParams.entries()),
             document.title,
@@ -55,7 +62,14 @@ export function createListing<T>(
 
         loadingText.classList.remove("hidden");
 
-        getData(searchParams).then((resp: {data: T[], total_pages: number}) => {
+        // the cursor continues from where the last page ended, which costs the same on any page
+        const dataParams = new URLSearchParams(searchParams);
+        if (cursor !== null) {
+            dataParams.set("cursor", cursor);
+        }
+
+        nextCursor = null;
+        getData(dataParams).then((resp: {data: T[], total_pages: number, next_cursor: string | null, max_page: number}) => {
             loadingText.classList.add("hidden");
 
             if (resp === undefined) {
@@ -63,15 +77,23 @@ export function createListing<T>(
                 return;
             }
 
+            nextCursor = resp.next_cursor;
+            maxPage = resp.max_page;
             listingContainer.append(...resp.data.map(createListingItem));
-            createPageNavigator(page, resp.total_pages, reloadPage);
+            // pages after max_page can't be jumped to, only reached one at a time through the cursor
+            const reachablePages = Math.max(maxPage, nextCursor === null ? page : page + 1);
+            createPageNavigator(page, Math.min(resp.total_pages, reachablePages), reloadPage);
         });
     }
 
     function reloadPage(evt: MouseEvent) {
-        page = onPageClick(evt, page);
+        const newPage = onPageClick(evt, page);
+        const cursor = newPage === page + 1 ? nextCursor : null;
+
+        // earlier pages after max_page have no cursor kept, so those start again from max_page
+        page = cursor === null ? Math.min(newPage, maxPage) : newPage;
         searchParams.set("p", page.toString());
-        loadPage();
+        loadPage(cursor);
     }
 
     function switchSort(elm) {
@@ -90,8 +112,12 @@ export function createListing<T>(
     const sortOptions = [
         document.getElementById("recent-sort"),
         document.getElementById("favorites-sort"),
-        document.getElementById("trending-sort")
+        document.getElementById("trending-sort"),
+        document.getElementById("relevance-sort")
     ];
+    const [recentSort, , , relevanceSort] = sortOptions;
+
+    relevanceSort.classList.toggle("hidden", query === "");
 
     for (const option of sortOptions) {
         if (sort === option.id.split("-")[0]) {
@@ -112,6 +138,15 @@ export function createListing<T>(
         page = 1;
         searchParams.set("q", query);
         searchParams.set("p", "1")
+
+        relevanceSort.classList.toggle("hidden", query === "");
+        if (query === "" && sort === "relevance") {
+            sort = "recent";
+            searchParams.set("s", sort);
+            switchSort(recentSort);
+            return;
+        }
+
         loadPage();
     });
 
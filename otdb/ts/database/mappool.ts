@@ -100,6 +100,15 @@ function getRealAttributes(beatmap: MappoolBeatmap): {
         bpm *= 0.75;
     }
 
+    // calculated on the server, so these are exact where the above is an estimate
+    if (beatmap.difficulty) {
+        cs = beatmap.difficulty.cs;
+        hp = beatmap.difficulty.hp;
+        od = beatmap.difficulty.od;
+        ar = beatmap.difficulty.ar;
+        bpm = beatmap.difficulty.bpm;
+    }
+
     return {
         cs: {
             value: Math.round(cs * 10) / 10,
@@ -13,25 +13,14 @@ CREATE OR REPLACE FUNCTION public.new_mappool(
     COST 100
     VOLATILE PARALLEL UNSAFE
 AS $BODY$
-DECLARE 
-	n_i int := 1;
-	n_mod_i int := 1;
+DECLARE
 	n_mp_id int := n_existing_id;
-	n_mb_id int;
-	n_avg_sr float := 0.0;
-    r_tmp_mpbm record;
-    b_mpbm_exists boolean;
-    r_tmp_bm_mod record;
-    b_mod_matches boolean;
-    n_mod_id int;
+	n_avg_sr float;
+	n_rerated_ids int[];
 
 BEGIN
 
-FOR n_i IN 1 .. array_length(r_mpbm, 1) LOOP
-	n_avg_sr := n_avg_sr + r_mpbm[n_i].star_rating;
-END LOOP;
-n_avg_sr := n_avg_sr / array_length(r_mpbm, 1);
-n_i := 1;
+SELECT avg(star_rating) INTO n_avg_sr FROM unnest(r_mpbm);
 
 -- If not editing a mappool
 IF n_existing_id = 0 THEN
@@ -39,161 +28,218 @@ IF n_existing_id = 0 THEN
 		name,
 	    description,
 		submitted_by_id,
-		avg_star_rating
+		avg_star_rating,
+		trending_score,
+		favorite_count
 	) VALUES (
 		v_title,
 	    v_description,
 		n_submitted_by,
-		n_avg_sr
+		n_avg_sr,
+		0,
+		0
 	) RETURNING id INTO n_mp_id;
 ELSE
 	UPDATE database_mappool SET
 		name = v_title,
 		description = v_description,
 		avg_star_rating = n_avg_sr
-	WHERE id = n_existing_id;
-    -- Easier to delete all connections and recreate new ones
-	DELETE FROM database_mappoolbeatmapconnection WHERE mappool_id = n_existing_id;
+	WHERE id = n_existing_id AND
+		(name, description, avg_star_rating) IS DISTINCT FROM (v_title, v_description, n_avg_sr);
 END IF;
 
-FOR n_i IN 1 .. array_length(r_mpbm, 1) LOOP
-	INSERT INTO database_beatmapmetadata (
-		id, 
-		difficulty, 
-		ar, 
-		od, 
-		cs, 
-		hp, 
-		length,
-		bpm
-	) VALUES (
-		r_bm_md[n_i].id,
-		r_bm_md[n_i].difficulty,
-		r_bm_md[n_i].ar,
-		r_bm_md[n_i].od,
-		r_bm_md[n_i].cs,
-		r_bm_md[n_i].hp,
-		r_bm_md[n_i].length,
-		r_bm_md[n_i].bpm
-	) ON CONFLICT (id) DO UPDATE
-		SET difficulty = r_bm_md[n_i].difficulty,
-			ar = r_bm_md[n_i].ar,
-			od = r_bm_md[n_i].od,
-			cs = r_bm_md[n_i].cs,
-			hp = r_bm_md[n_i].hp,
-			length = r_bm_md[n_i].length,
-			bpm = r_bm_md[n_i].bpm;
-	
-	INSERT INTO database_beatmapsetmetadata (
-		id,
-		artist,
-		title,
-		creator
-	) VALUES (
-		r_bms_md[n_i].id,
-		r_bms_md[n_i].artist,
-		r_bms_md[n_i].title,
-		r_bms_md[n_i].creator
-	) ON CONFLICT (id) DO UPDATE
-		SET artist = r_bms_md[n_i].artist,
-			title = r_bms_md[n_i].title,
-			creator = r_bms_md[n_i].creator;
-
-	-- Check if this mappoolbeatmap already exists in the db (with same mods)
-
-	b_mpbm_exists := false;
-
-	FOR r_tmp_mpbm IN SELECT * FROM database_mappoolbeatmap WHERE beatmap_metadata_id = r_bm_md[n_i].id LOOP
-	    b_mpbm_exists := true;
-
-	    -- If both mappoolbeatmaps have no mods
-	    IF coalesce(array_length(r_bm_mods, 2), 0) = 0 AND (SELECT COUNT(*) FROM database_mappoolbeatmap_mods WHERE mappoolbeatmap_id = r_tmp_mpbm.id) = 0 THEN
-	        b_mpbm_exists := true;
-	    ELSE
-	        -- Check that mods on both mappoolbeatmap rows match
-            FOR r_tmp_bm_mod IN (
-                SELECT acronym, settings FROM database_mappoolbeatmap_mods
-                INNER JOIN database_beatmapmod ON (database_beatmapmod.id = database_mappoolbeatmap_mods.beatmapmod_id)
-                WHERE mappoolbeatmap_id = r_tmp_mpbm.id
-            ) LOOP
-                b_mod_matches := false;
-
-                FOR n_mod_i IN coalesce(array_lower(r_bm_mods, 2), 1) .. coalesce(array_upper(r_bm_mods, 2), 0) LOOP  -- array_length returning null sometimes
-                    IF r_bm_mods[n_i][n_mod_i].acronym = r_tmp_bm_mod.acronym AND r_bm_mods[n_i][n_mod_i].settings = r_tmp_bm_mod.settings THEN
-                        b_mod_matches := true;
-                        EXIT;
-                    END IF;
-                END LOOP;
-
-                n_mod_i := 1;
-
-                IF NOT b_mod_matches THEN
-                    b_mpbm_exists := false;
-                    EXIT;
-                END IF;
-            END LOOP;
-        END IF;
-
-	    IF b_mpbm_exists = true THEN
-	        n_mb_id := r_tmp_mpbm.id;
-            EXIT;
-        END IF;
-    END LOOP;
-
-	IF NOT b_mpbm_exists THEN
-        INSERT INTO database_mappoolbeatmap (
-            star_rating,
-            beatmap_metadata_id,
-            beatmapset_metadata_id
-        ) VALUES (
-            r_mpbm[n_i].star_rating,
-            r_bm_md[n_i].id,
-            r_bms_md[n_i].id
-        ) RETURNING id INTO n_mb_id;
-    -- TODO: update existing row if exists
-    END IF;
-	
-	INSERT INTO database_mappoolbeatmapconnection (
-		mappool_id,
-		beatmap_id,
-	    slot
-	) VALUES (
-		n_mp_id,
-		n_mb_id,
-	    r_slots[n_i]
+-- The same beatmap (or beatmapset) can be in a pool more than once,
+-- but a row can only be upserted once per statement, so the freshest copy is used
+INSERT INTO database_beatmapmetadata (
+	id,
+	difficulty,
+	ar,
+	od,
+	cs,
+	hp,
+	length,
+	bpm,
+	checksum,
+	fetched_at
+)
+SELECT DISTINCT ON (bm.id)
+	bm.id,
+	bm.difficulty,
+	bm.ar,
+	bm.od,
+	bm.cs,
+	bm.hp,
+	bm.length,
+	bm.bpm,
+	bm.checksum,
+	bm.fetched_at
+FROM unnest(r_bm_md) bm
+ORDER BY bm.id, bm.fetched_at DESC NULLS LAST, bm.checksum = ''
+ON CONFLICT (id) DO UPDATE
+	SET difficulty = excluded.difficulty,
+		ar = excluded.ar,
+		od = excluded.od,
+		cs = excluded.cs,
+		hp = excluded.hp,
+		length = excluded.length,
+		bpm = excluded.bpm,
+		checksum = excluded.checksum,
+		fetched_at = excluded.fetched_at
+	-- Don't let older copies (e.g. read back from the database) overwrite newer ones
+	WHERE excluded.fetched_at IS NOT NULL AND (
+		database_beatmapmetadata.fetched_at IS NULL OR
+		excluded.fetched_at >= database_beatmapmetadata.fetched_at
+	)
+	-- Don't rewrite rows that haven't changed
+	AND (
+		database_beatmapmetadata.difficulty,
+		database_beatmapmetadata.ar,
+		database_beatmapmetadata.od,
+		database_beatmapmetadata.cs,
+		database_beatmapmetadata.hp,
+		database_beatmapmetadata.length,
+		database_beatmapmetadata.bpm,
+		database_beatmapmetadata.checksum,
+		database_beatmapmetadata.fetched_at
+	) IS DISTINCT FROM (
+		excluded.difficulty,
+		excluded.ar,
+		excluded.od,
+		excluded.cs,
+		excluded.hp,
+		excluded.length,
+		excluded.bpm,
+		excluded.checksum,
+		excluded.fetched_at
 	);
 
-	-- Insert mods
-	IF coalesce(array_length(r_bm_mods, 2), 0) > 0 THEN
-        FOR n_mod_i IN coalesce(array_lower(r_bm_mods, 2), 1) .. coalesce(array_upper(r_bm_mods, 2), 0) LOOP
-            IF r_bm_mods[n_i][n_mod_i].acronym IS NULL THEN
-                CONTINUE;
-            END IF;
-
-            INSERT INTO database_beatmapmod (
-                acronym,
-                settings
-            ) VALUES (
-                r_bm_mods[n_i][n_mod_i].acronym,
-                r_bm_mods[n_i][n_mod_i].settings
-            )
-            ON CONFLICT (acronym, settings) DO UPDATE
-                SET acronym = excluded.acronym  -- do something so id is returned
-            RETURNING id INTO n_mod_id;
+INSERT INTO database_beatmapsetmetadata (
+	id,
+	artist,
+	title,
+	creator
+)
+SELECT DISTINCT ON (bms.id)
+	bms.id,
+	bms.artist,
+	bms.title,
+	bms.creator
+FROM unnest(r_bms_md) bms
+ON CONFLICT (id) DO UPDATE
+	SET artist = excluded.artist,
+		title = excluded.title,
+		creator = excluded.creator
+	WHERE (
+		database_beatmapsetmetadata.artist,
+		database_beatmapsetmetadata.title,
+		database_beatmapsetmetadata.creator
+	) IS DISTINCT FROM (
+		excluded.artist,
+		excluded.title,
+		excluded.creator
+	);
 
-            INSERT INTO database_mappoolbeatmap_mods (
-                mappoolbeatmap_id,
-                beatmapmod_id
-            ) VALUES (
-                n_mb_id,
-                n_mod_id
-            ) ON CONFLICT (mappoolbeatmap_id, beatmapmod_id) DO NOTHING;
-        END LOOP;
-    END IF;
-	
-	n_i := n_i + 1;
-	n_mod_i := 1;
-END LOOP;
+-- Rows of r_bm_mods are padded with null acronyms up to the longest mod list
+INSERT INTO database_beatmapmod (
+	acronym,
+	settings
+)
+SELECT DISTINCT m.acronym, m.settings
+FROM unnest(r_bm_mods) m
+WHERE m.acronym IS NOT NULL
+ON CONFLICT (acronym, settings) DO NOTHING;
+
+-- Mappool beatmaps with the same beatmap and mods are shared between mappools,
+-- so other mappools are affected by the star ratings updated below
+SELECT array_agg(DISTINCT mpbm.id) INTO n_rerated_ids
+FROM unnest(r_mpbm) r
+INNER JOIN database_mappoolbeatmap mpbm ON (
+	mpbm.beatmap_metadata_id = r.beatmap_metadata_id AND
+	mpbm.signature = r.signature
+)
+WHERE mpbm.star_rating IS DISTINCT FROM r.star_rating;
+
+WITH created AS (
+	INSERT INTO database_mappoolbeatmap (
+		star_rating,
+		beatmap_metadata_id,
+		beatmapset_metadata_id,
+		signature
+	)
+	SELECT DISTINCT ON (mpbm.beatmap_metadata_id, mpbm.signature)
+		mpbm.star_rating,
+		mpbm.beatmap_metadata_id,
+		mpbm.beatmapset_metadata_id,
+		mpbm.signature
+	FROM unnest(r_mpbm) mpbm
+	-- Star ratings are recalculated when the calculator changes
+	ON CONFLICT (beatmap_metadata_id, signature) DO UPDATE
+		SET star_rating = excluded.star_rating
+		WHERE database_mappoolbeatmap.star_rating IS DISTINCT FROM excluded.star_rating
+	RETURNING id, beatmap_metadata_id, signature
+)
+INSERT INTO database_mappoolbeatmap_mods (
+	mappoolbeatmap_id,
+	beatmapmod_id
+)
+SELECT DISTINCT created.id, bm_mod.id
+FROM generate_subscripts(r_mpbm, 1) i
+INNER JOIN created ON (
+	created.beatmap_metadata_id = r_mpbm[i].beatmap_metadata_id AND
+	created.signature = r_mpbm[i].signature
+)
+CROSS JOIN generate_subscripts(r_bm_mods, 2) j
+INNER JOIN database_beatmapmod bm_mod ON (
+	bm_mod.acronym = r_bm_mods[i][j].acronym AND
+	bm_mod.settings = r_bm_mods[i][j].settings
+)
+ON CONFLICT (mappoolbeatmap_id, beatmapmod_id) DO NOTHING;
+
+-- Slots are unique within a mappool, so an edit only has to touch the slots that changed
+WITH wanted AS (
+	SELECT mpbm.id AS beatmap_id, r_slots[i] AS slot
+	FROM generate_subscripts(r_mpbm, 1) i
+	INNER JOIN database_mappoolbeatmap mpbm ON (
+		mpbm.beatmap_metadata_id = r_mpbm[i].beatmap_metadata_id AND
+		mpbm.signature = r_mpbm[i].signature
+	)
+), removed AS (
+	DELETE FROM database_mappoolbeatmapconnection mpbmc
+	WHERE mpbmc.mappool_id = n_mp_id AND mpbmc.slot NOT IN (SELECT slot FROM wanted)
+), changed AS (
+	UPDATE database_mappoolbeatmapconnection mpbmc
+	SET beatmap_id = wanted.beatmap_id
+	FROM wanted
+	WHERE mpbmc.mappool_id = n_mp_id AND mpbmc.slot = wanted.slot AND mpbmc.beatmap_id <> wanted.beatmap_id
+)
+INSERT INTO database_mappoolbeatmapconnection (
+	mappool_id,
+	beatmap_id,
+	slot
+)
+SELECT n_mp_id, wanted.beatmap_id, wanted.slot
+FROM wanted
+WHERE NOT EXISTS (
+	SELECT 1 FROM database_mappoolbeatmapconnection mpbmc
+	WHERE mpbmc.mappool_id = n_mp_id AND mpbmc.slot = wanted.slot
+);
+
+-- Other mappools using a beatmap whose star rating changed get their average recomputed
+IF n_rerated_ids IS NOT NULL THEN
+	UPDATE database_mappool mp SET
+		avg_star_rating = rated.avg_star_rating
+	FROM (
+		SELECT mpbmc.mappool_id, avg(mpbm.star_rating) AS avg_star_rating
+		FROM database_mappoolbeatmapconnection mpbmc
+		INNER JOIN database_mappoolbeatmap mpbm ON mpbm.id = mpbmc.beatmap_id
+		WHERE mpbmc.mappool_id IN (
+			SELECT mappool_id FROM database_mappoolbeatmapconnection
+			WHERE beatmap_id = ANY(n_rerated_ids) AND mappool_id <> n_mp_id
+		)
+		GROUP BY mpbmc.mappool_id
+	) rated
+	WHERE mp.id = rated.mappool_id AND mp.avg_star_rating IS DISTINCT FROM rated.avg_star_rating;
+END IF;
 
 RETURN n_mp_id;
 
@@ -14,8 +14,6 @@ CREATE OR REPLACE FUNCTION public.new_tournament(
     VOLATILE PARALLEL UNSAFE
 AS $BODY$
 DECLARE
-	n_user_i int := 1;
-	n_mappool_id int := 1;
 	n_tournament_id int := n_id;
 	
 BEGIN
@@ -26,13 +24,17 @@ IF n_tournament_id = 0 THEN
 		name,
 		description,
 		link,
-		submitted_by_id
+		submitted_by_id,
+		trending_score,
+		favorite_count
 	) VALUES (
 		v_abbr,
 		v_name,
 		v_description,
 		v_link,
-		n_submitted_by
+		n_submitted_by,
+		0,
+		0
 	) RETURNING id INTO n_tournament_id;
 ELSE
 	UPDATE database_tournament SET
@@ -40,57 +42,57 @@ ELSE
 		name = v_name,
 		description = v_description,
 		link = v_link
-	WHERE id = n_tournament_id;
-	DELETE FROM database_tournamentinvolvement WHERE tournament_id = n_tournament_id;
-	DELETE FROM database_mappoolconnection WHERE tournament_id = n_tournament_id;
-END IF;
+	WHERE id = n_tournament_id AND
+		(abbreviation, name, description, link) IS DISTINCT FROM (v_abbr, v_name, v_description, v_link);
 
-WHILE n_mappool_id <= array_length(r_mappools, 1) LOOP
-	INSERT INTO database_mappoolconnection (
-		tournament_id,
-		mappool_id,
-		name_override
-	) VALUES (
-		n_tournament_id,
-		r_mappools[n_mappool_id].mappool_id,
-		r_mappools[n_mappool_id].name_override
-	);
-	
-	n_mappool_id := n_mappool_id + 1;
-END LOOP;
+	-- Only remove what's no longer part of the tournament, the rest is upserted below
+	DELETE FROM database_tournamentinvolvement
+	WHERE tournament_id = n_tournament_id AND user_id NOT IN (SELECT u.id FROM unnest(r_users) u);
+	DELETE FROM database_mappoolconnection
+	WHERE tournament_id = n_tournament_id AND mappool_id NOT IN (SELECT mpc.mappool_id FROM unnest(r_mappools) mpc);
+END IF;
 
-WHILE n_user_i <= array_length(r_users, 1) LOOP
-	INSERT INTO main_osuuser (
-		id,
-		username,
-		avatar,
-		cover,
-		is_admin
-	) VALUES (
-		r_users[n_user_i].id,
-		r_users[n_user_i].username,
-		r_users[n_user_i].avatar,
-		r_users[n_user_i].cover,
-		r_users[n_user_i].is_admin
-	) ON CONFLICT (id) DO UPDATE SET
-		username = r_users[n_user_i].username,
-		avatar = r_users[n_user_i].avatar,
-		cover = r_users[n_user_i].cover;
+INSERT INTO database_mappoolconnection (
+	tournament_id,
+	mappool_id,
+	name_override
+)
+SELECT DISTINCT ON (mpc.mappool_id) n_tournament_id, mpc.mappool_id, mpc.name_override
+FROM unnest(r_mappools) mpc
+ON CONFLICT (tournament_id, mappool_id) DO UPDATE SET
+	name_override = excluded.name_override
+WHERE database_mappoolconnection.name_override IS DISTINCT FROM excluded.name_override;
 
-	INSERT INTO database_tournamentinvolvement (
-		roles,
-		tournament_id,
-		user_id
-	) VALUES (
-		r_roles[n_user_i],
-		n_tournament_id,
-		r_users[n_user_i].id
-	);
+-- A row can only be upserted once per statement
+INSERT INTO main_osuuser (
+	id,
+	username,
+	avatar,
+	cover,
+	is_admin
+)
+SELECT DISTINCT ON (u.id) u.id, u.username, u.avatar, u.cover, u.is_admin
+FROM unnest(r_users) u
+ON CONFLICT (id) DO UPDATE SET
+	username = excluded.username,
+	avatar = excluded.avatar,
+	cover = excluded.cover
+WHERE (main_osuuser.username, main_osuuser.avatar, main_osuuser.cover)
+	IS DISTINCT FROM (excluded.username, excluded.avatar, excluded.cover);
 
-	n_user_i := n_user_i + 1;
-END LOOP;
+INSERT INTO database_tournamentinvolvement (
+	roles,
+	tournament_id,
+	user_id
+)
+SELECT DISTINCT ON (r_users[i].id) r_roles[i], n_tournament_id, r_users[i].id
+FROM generate_subscripts(r_users, 1) i
+ORDER BY r_users[i].id, i
+ON CONFLICT (tournament_id, user_id) DO UPDATE SET
+	roles = excluded.roles
+WHERE database_tournamentinvolvement.roles <> excluded.roles;
 
 RETURN n_tournament_id;
 
 END;
-$BODY$;
\ No newline at end of file
+$BODY$;
@@ -0,0 +1,139 @@
+-- search_vector columns of tournaments and mappools, kept current by the triggers below.
+-- The config has to match SEARCH_CONFIG in api/views/listing.py
+
+CREATE OR REPLACE FUNCTION public.tournament_search_vector(
+	v_name character varying,
+	v_abbr character varying,
+	v_description character varying)
+    RETURNS tsvector
+    LANGUAGE 'sql'
+    COST 100
+    IMMUTABLE PARALLEL SAFE
+AS $BODY$
+SELECT
+	setweight(to_tsvector('english', v_name), 'A') ||
+	setweight(to_tsvector('english', v_abbr), 'A') ||
+	setweight(to_tsvector('english', v_description), 'C')
+$BODY$;
+
+-- includes the text of every tournament the mappool is in
+CREATE OR REPLACE FUNCTION public.mappool_search_vector(
+	n_mappool_id bigint,
+	v_name character varying)
+    RETURNS tsvector
+    LANGUAGE 'sql'
+    COST 100
+    STABLE PARALLEL SAFE
+AS $BODY$
+SELECT
+	setweight(to_tsvector('english', v_name), 'A') ||
+	setweight(to_tsvector('english', coalesce(string_agg(conn.name_override, ' '), '')), 'A') ||
+	setweight(to_tsvector('english', coalesce(string_agg(t.name || ' ' || t.abbreviation, ' '), '')), 'B') ||
+	setweight(to_tsvector('english', coalesce(string_agg(t.description, ' '), '')), 'D')
+FROM database_mappoolconnection conn
+INNER JOIN database_tournament t ON t.id = conn.tournament_id
+WHERE conn.mappool_id = n_mappool_id
+$BODY$;
+
+CREATE OR REPLACE FUNCTION public.refresh_mappool_search_vector(
+	n_mappool_id bigint)
+    RETURNS void
+    LANGUAGE 'sql'
+    COST 100
+    VOLATILE PARALLEL UNSAFE
+AS $BODY$
+UPDATE database_mappool
+SET search_vector = mappool_search_vector(id, name)
+WHERE id = n_mappool_id
+$BODY$;
+
+-- tournaments
+
+CREATE OR REPLACE FUNCTION public.tournament_search_vector_trigger()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+    COST 100
+    VOLATILE NOT LEAKPROOF
+AS $BODY$
+BEGIN
+
+NEW.search_vector := tournament_search_vector(NEW.name, NEW.abbreviation, NEW.description);
+RETURN NEW;
+
+END;
+$BODY$;
+
+CREATE OR REPLACE TRIGGER tournament_search_vector
+	BEFORE INSERT OR UPDATE OF name, abbreviation, description ON database_tournament
+	FOR EACH ROW EXECUTE FUNCTION tournament_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION public.tournament_mappools_search_vector_trigger()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+    COST 100
+    VOLATILE NOT LEAKPROOF
+AS $BODY$
+BEGIN
+
+PERFORM refresh_mappool_search_vector(conn.mappool_id)
+FROM database_mappoolconnection conn
+WHERE conn.tournament_id = NEW.id;
+RETURN NULL;
+
+END;
+$BODY$;
+
+CREATE OR REPLACE TRIGGER tournament_mappools_search_vector
+	AFTER UPDATE OF name, abbreviation, description ON database_tournament
+	FOR EACH ROW
+	WHEN (
+		OLD.name IS DISTINCT FROM NEW.name OR
+		OLD.abbreviation IS DISTINCT FROM NEW.abbreviation OR
+		OLD.description IS DISTINCT FROM NEW.description
+	)
+	EXECUTE FUNCTION tournament_mappools_search_vector_trigger();
+
+-- mappools
+
+CREATE OR REPLACE FUNCTION public.mappool_search_vector_trigger()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+    COST 100
+    VOLATILE NOT LEAKPROOF
+AS $BODY$
+BEGIN
+
+NEW.search_vector := mappool_search_vector(NEW.id, NEW.name);
+RETURN NEW;
+
+END;
+$BODY$;
+
+CREATE OR REPLACE TRIGGER mappool_search_vector
+	BEFORE INSERT OR UPDATE OF name ON database_mappool
+	FOR EACH ROW EXECUTE FUNCTION mappool_search_vector_trigger();
+
+-- tournament connections of mappools
+
+CREATE OR REPLACE FUNCTION public.mappoolconnection_search_vector_trigger()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+    COST 100
+    VOLATILE NOT LEAKPROOF
+AS $BODY$
+BEGIN
+
+IF TG_OP <> 'INSERT' THEN
+	PERFORM refresh_mappool_search_vector(OLD.mappool_id);
+END IF;
+IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.mappool_id <> OLD.mappool_id) THEN
+	PERFORM refresh_mappool_search_vector(NEW.mappool_id);
+END IF;
+RETURN NULL;
+
+END;
+$BODY$;
+
+CREATE OR REPLACE TRIGGER mappoolconnection_search_vector
+	AFTER INSERT OR UPDATE OR DELETE ON database_mappoolconnection
+	FOR EACH ROW EXECUTE FUNCTION mappoolconnection_search_vector_trigger();
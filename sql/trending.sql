@@ -0,0 +1,25 @@
+-- Trending score of a mappool or tournament from its favorites' timestamps, see TRENDING_RATE
+-- in database/models.py: ln(1 + sum(exp(timestamp * rate))), or 0 without favorites.
+-- Each term is scaled by the largest one so exp can't overflow, and exp underflowing
+-- raises an error instead of giving 0, so terms too small to matter are clamped.
+
+CREATE OR REPLACE FUNCTION public.trending_score(
+	n_timestamps bigint[],
+	f_rate double precision)
+    RETURNS double precision
+    LANGUAGE 'sql'
+    COST 100
+    IMMUTABLE PARALLEL SAFE
+AS $BODY$
+SELECT coalesce((
+	SELECT max_weight + ln(
+		exp(greatest(-max_weight, -700)) +
+		sum(exp(greatest(weight - max_weight, -700)))
+	)
+	FROM (
+		SELECT ts * f_rate AS weight, max(ts * f_rate) OVER () AS max_weight
+		FROM unnest(n_timestamps) ts
+	) weights
+	GROUP BY max_weight
+), 0)
+$BODY$;